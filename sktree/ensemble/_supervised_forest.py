@@ -2,6 +2,7 @@ from sklearn.ensemble._forest import ForestClassifier
 from sklearn.utils._param_validation import StrOptions
 
 from sktree.tree import ObliqueDecisionTreeClassifier, PatchObliqueDecisionTreeClassifier
+from sktree.tree._classes import _check_patch_geometry
 
 
 class ObliqueRandomForestClassifier(ForestClassifier):
@@ -246,6 +247,11 @@ class ObliqueRandomForestClassifier(ForestClassifier):
     search of the best split. To obtain a deterministic behaviour during
     fitting, ``random_state`` has to be fixed.
 
+    Sparse projections are computed one feature at a time over the samples of a
+    node. Passing ``X`` in Fortran order (e.g. with :func:`numpy.asfortranarray`)
+    makes these reads contiguous and speeds up fitting when ``n_features`` is
+    large; ``X`` is not copied into that layout internally.
+
     References
     ----------
     .. [1] L. Breiman, "Random Forests", Machine Learning, 45(1), 5-32, 2001.
@@ -666,3 +672,17 @@ class PatchObliqueRandomForestClassifier(ForestClassifier):
         self.min_weight_fraction_leaf = min_weight_fraction_leaf
         self.max_leaf_nodes = max_leaf_nodes
         self.min_impurity_decrease = min_impurity_decrease
+
+    def _validate_estimator(self, default=None):
+        super()._validate_estimator(default)
+
+        # the base forest validates X before it makes any tree and fits the
+        # trees with ``check_input=False``; the patch dimensions only depend on
+        # the parameters and the number of features, so they are checked once
+        # here and handed to the trees, which then skip their own check
+        self._patch_geometry = _check_patch_geometry(self, self.n_features_in_)
+
+    def _make_estimator(self, append=True, random_state=None):
+        estimator = super()._make_estimator(append=append, random_state=random_state)
+        estimator._patch_geometry = self._patch_geometry
+        return estimator
@@ -22,10 +22,61 @@ from sklearn.ensemble._forest import (
 )
 from sklearn.metrics import calinski_harabasz_score
 from sklearn.tree._tree import DTYPE
+from sklearn.utils._openmp_helpers import _openmp_effective_n_threads
 from sklearn.utils.parallel import Parallel, delayed
 from sklearn.utils.validation import _check_sample_weight, check_is_fitted, check_random_state
 
 from sktree.tree import UnsupervisedDecisionTree, UnsupervisedObliqueDecisionTree
+from sktree.tree._affinity import _accumulate_affinity
+from sktree.tree._classes import _group_by_leaf
+
+
+def _count_co_occurrences(leaf_index, n_groups, n_threads, mask=None):
+    """Count how many times each pair of samples falls into the same group.
+
+    Parameters
+    ----------
+    leaf_index : ndarray of shape (n_trees, n_samples)
+        The group of each sample in each tree, numbered consecutively over all
+        trees, i.e. the groups of different trees are disjoint.
+    n_groups : int
+        The total number of groups.
+    n_threads : int
+        The number of OpenMP threads to use.
+    mask : ndarray of shape (n_trees, n_samples), dtype=bool, optional
+        Whether each sample is counted in each tree. By default, all samples
+        are counted.
+
+    Returns
+    -------
+    counts : ndarray of shape (n_samples, n_samples)
+        The co-occurrence counts, in the smallest unsigned dtype that can hold
+        ``n_trees``.
+    """
+    n_trees, n_samples = leaf_index.shape
+    if mask is not None:
+        # send samples that are not counted to an extra group that is left empty
+        leaf_index = np.where(mask, leaf_index, n_groups)
+        n_groups += 1
+    leaf_index = np.ascontiguousarray(leaf_index, dtype=np.intp)
+
+    # group the samples of all trees in a single pass, leaving out the samples
+    # that are not counted
+    if mask is not None:
+        kept = np.flatnonzero(mask)
+        _, order, bounds = _group_by_leaf(leaf_index.ravel()[kept], n_groups)
+        order = kept[order]
+    else:
+        _, order, bounds = _group_by_leaf(leaf_index.ravel(), n_groups)
+    np.remainder(order, n_samples, out=order)
+
+    # accumulate the co-occurrence counts in the smallest dtype that can hold
+    # ``n_trees``, which shrinks the buffer that is repeatedly written
+    counts = np.zeros((n_samples, n_samples), dtype=np.min_scalar_type(n_trees))
+
+    # add all samples that co-occur in the same group, in parallel over rows
+    _accumulate_affinity(leaf_index, order, bounds, counts, n_threads)
+    return counts
 
 
 class ForestCluster(TransformerMixin, ClusterMixin, BaseForest):
@@ -251,21 +302,38 @@ class ForestCluster(TransformerMixin, ClusterMixin, BaseForest):
         -------
         prox_matrix : array-like of shape (n_samples, n_samples)
         """
-        n_samples = X.shape[0]
-        aff_matrix = np.zeros((n_samples, n_samples), dtype=np.float32)
+        # unlike joblib, sklearn's OpenMP helper maps None to all threads
+        n_threads = 1 if self.n_jobs is None else _openmp_effective_n_threads(self.n_jobs)
 
-        # fill the main diagonal with 1's
-        # np.fill_diagonal(aff_matrix, 1.0)
-        for idx in range(self.n_estimators):
-            for unique_leaf in np.unique(X[:, idx]):
-                # find all samples
-                samples_in_leaf = np.atleast_1d(np.argwhere(X[:, idx] == unique_leaf).squeeze())
-                aff_matrix[np.ix_(samples_in_leaf, samples_in_leaf)] += 1
+        leaf_index, n_leaves = self._number_leaves(X)
+        counts = _count_co_occurrences(leaf_index, n_leaves, n_threads)
 
         # normalize by the number of trees
-        aff_matrix = np.divide(aff_matrix, self.n_estimators)
+        aff_matrix = np.divide(counts, self.n_estimators, dtype=np.float32)
         return aff_matrix
 
+    def _number_leaves(self, X_leaves):
+        """Number the leaves of all trees consecutively.
+
+        Parameters
+        ----------
+        X_leaves : ndarray of shape (n_samples, n_estimators)
+            For each datapoint x in X and for each tree in the forest,
+            is the index of the leaf x ends up in.
+
+        Returns
+        -------
+        leaf_index : ndarray of shape (n_estimators, n_samples)
+            The leaf of each sample in each tree, offset by the number of nodes
+            in the preceding trees, so that the leaves of all trees are distinct.
+        n_leaves : int
+            The total number of nodes in the forest.
+        """
+        node_counts = [tree.tree_.node_count for tree in self.estimators_]
+        node_offsets = np.cumsum([0] + node_counts[:-1])
+        leaf_index = (X_leaves + node_offsets).T
+        return leaf_index, sum(node_counts)
+
     def _assign_labels(self, affinity_matrix):
         """Assign cluster labels given X.
 
@@ -289,35 +357,16 @@ class ForestCluster(TransformerMixin, ClusterMixin, BaseForest):
             self.clustering_func_args_ = self.clustering_func_args
         cluster = self.clustering_func_(**self.clustering_func_args_)
 
+        # The affinity matrix is clustered without restricting the merges to a
+        # sparse connectivity graph (e.g. of the thresholded affinities), which
+        # would change the clustering and makes AgglomerativeClustering switch to
+        # its structured ward tree, which is slower on such dense-ish graphs. A
+        # ``connectivity`` can still be passed through ``clustering_func_args``.
+
         # apply agglomerative clustering to obtain cluster labels
         predict_labels = cluster.fit_predict(affinity_matrix)
         return predict_labels
 
-    @staticmethod
-    def _get_oob_predictions(tree, X):
-        """Compute the OOB transformations for an individual tree.
-
-        Parameters
-        ----------
-        tree : UnsupervisedDecisionTree object
-            A single unsupervised decision tree model.
-        X : ndarray of shape (n_samples, n_features)
-            The OOB samples.
-
-        Returns
-        -------
-        tree_prox_matrix : ndarray of shape (n_samples, n_samples)
-            The OOB associated proximity matrix.
-        """
-        # transform X
-        # apply to the leaves
-        X_leaves = tree.apply(X)
-
-        # now compute the affinity matrix and set it
-        tree_prox_matrix = tree._compute_affinity_matrix(X_leaves)
-
-        return tree_prox_matrix
-
     def _compute_oob_predictions(self, X, y=None):
         """Compute the OOB transformations.
 
@@ -343,29 +392,32 @@ class ForestCluster(TransformerMixin, ClusterMixin, BaseForest):
             X = X.tocsr()
 
         n_samples = X.shape[0]
+        # unlike joblib, sklearn's OpenMP helper maps None to all threads
+        n_threads = 1 if self.n_jobs is None else _openmp_effective_n_threads(self.n_jobs)
 
-        # for clustering, n_classes_ does not exist and we create an empty
-        # axis to be consistent with the classification case and make
-        # the array operations compatible with the 2 settings
-        oob_pred_shape = (n_samples, n_samples)
-
-        oob_pred = np.zeros(shape=oob_pred_shape, dtype=np.float64)
-        n_oob_pred = np.zeros((n_samples, n_samples), dtype=np.int64)
-
+        # find which samples are out-of-bag for each tree
         n_samples_bootstrap = _get_n_samples_bootstrap(
             n_samples,
             self.max_samples,
         )
-        for estimator in self.estimators_:
+        oob_mask = np.zeros((self.n_estimators, n_samples), dtype=bool)
+        for idx, estimator in enumerate(self.estimators_):
             unsampled_indices = _generate_unsampled_indices(
                 estimator.random_state,
                 n_samples,
                 n_samples_bootstrap,
             )
+            oob_mask[idx, unsampled_indices] = True
 
-            tree_prox_matrix = self._get_oob_predictions(estimator, X[unsampled_indices, :])
-            oob_pred[np.ix_(unsampled_indices, unsampled_indices)] += tree_prox_matrix
-            n_oob_pred[np.ix_(unsampled_indices, unsampled_indices)] += 1
+        # count, for each pair of samples, the number of trees in which they are
+        # both OOB and in the same leaf, and the number of trees in which they
+        # are both OOB
+        leaf_index, n_leaves = self._number_leaves(self.apply(X))
+        oob_pred = _count_co_occurrences(leaf_index, n_leaves, n_threads, mask=oob_mask)
+        oob_pred = oob_pred.astype(np.float64)
+
+        tree_index = np.repeat(np.arange(self.n_estimators)[:, np.newaxis], n_samples, axis=1)
+        n_oob_pred = _count_co_occurrences(tree_index, self.n_estimators, n_threads, mask=oob_mask)
 
         if (n_oob_pred == 0).any():
             warn(
@@ -376,12 +428,12 @@ class ForestCluster(TransformerMixin, ClusterMixin, BaseForest):
             )
             n_oob_pred[n_oob_pred == 0] = 1
 
-            # normalize by the number of times each oob sample proximity matrix was computed
-            oob_pred /= n_oob_pred
+        # normalize by the number of times each oob sample proximity matrix was computed
+        oob_pred /= n_oob_pred
 
         return oob_pred
 
-    def _set_oob_score_and_attributes(self, X, y, scoring_function=None):
+    def _set_oob_score_and_attributes(self, X, y=None, scoring_function=None):
         """Compute and set the OOB score and attributes.
 
         Parameters
@@ -389,7 +441,7 @@ class ForestCluster(TransformerMixin, ClusterMixin, BaseForest):
         X : array-like of shape (n_samples, n_features)
             The data matrix.
         y : ndarray of shape (n_samples, n_outputs)
-            The target matrix.
+            Not used.
         scoring_function : callable, default=None
             Scoring function for OOB score. Default is the
             :func:`sklearn.metrics.calinski_harabasz_score`.
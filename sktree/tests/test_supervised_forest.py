@@ -273,3 +273,36 @@ def test_check_importances(criterion, dtype):
         est.fit(X, y, sample_weight=scale * sample_weight)
         importances_bis = est.feature_importances_
         assert np.abs(importances - importances_bis).mean() < tolerance
+
+
+def test_patch_forest_checks_patch_geometry_once():
+    """Test that a patch forest checks its patch dimensions before building trees."""
+    X, y = X_large, y_large
+
+    est = PatchObliqueRandomForestClassifier(
+        n_estimators=10, data_height=3, data_width=4, random_state=0
+    )
+    with pytest.raises(RuntimeError, match="The passed in data height"):
+        est.fit(X, y)
+    assert not hasattr(est, "estimators_")
+
+    est.set_params(data_height=2, data_width=5, max_patch_width=6)
+    with pytest.raises(RuntimeError, match="The maximum patch width"):
+        est.fit(X, y)
+    assert not hasattr(est, "estimators_")
+
+    # the trees reuse the geometry checked by the forest
+    est.set_params(max_patch_width=5)
+    est.fit(X, y)
+    for tree in est.estimators_:
+        assert (tree.data_height_, tree.data_width_) == (2, 5)
+
+    # the geometry is only handed to the trees for the fit of the forest, so
+    # refitting a tree checks its own parameters again
+    tree = est.estimators_[0]
+    tree.set_params(data_height=3)
+    with pytest.raises(RuntimeError, match="The passed in data height"):
+        tree.fit(X, y)
+    tree.set_params(data_height=2)
+    with pytest.raises(RuntimeError, match="The passed in data height"):
+        tree.fit(X[:, :-1], y)
@@ -1,5 +1,6 @@
 import numpy as np
 import pytest
+from numpy.testing import assert_array_equal
 from sklearn import datasets
 from sklearn.cluster import AgglomerativeClustering
 from sklearn.datasets import make_blobs
@@ -110,3 +111,31 @@ def test_check_iris(name, forest, criterion):
     assert (
         score > expected_score
     ), f"{name}-iris failed with criterion {criterion} and score = {score}"
+
+
+@pytest.mark.parametrize("name, forest", FOREST_CLUSTERS.items())
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_affinity_matrix(name, forest, n_jobs):
+    X, _ = make_blobs(n_samples=50, centers=2, n_features=4, random_state=12345)
+
+    est = forest(n_estimators=10, n_jobs=n_jobs, random_state=12345)
+    est.fit(X)
+
+    # the affinity is the fraction of trees in which two samples share a leaf
+    X_leaves = est.apply(X)
+    expected = np.mean(X_leaves[:, None, :] == X_leaves[None, :, :], axis=2)
+    np.testing.assert_allclose(est.affinity_matrix_, expected, rtol=1e-6)
+
+
+@pytest.mark.parametrize("name, forest", FOREST_CLUSTERS.items())
+def test_oob_affinity_matrix(name, forest):
+    X, _ = make_blobs(n_samples=50, centers=2, n_features=4, random_state=12345)
+
+    est = forest(n_estimators=20, bootstrap=True, oob_score=True, random_state=12345)
+    est.fit(X)
+    oob_pred = est.oob_decision_function_
+
+    assert oob_pred.shape == (X.shape[0], X.shape[0])
+    assert np.all((oob_pred >= 0) & (oob_pred <= 1))
+    assert_array_equal(oob_pred, oob_pred.T)
+    assert est.oob_labels_.shape == (X.shape[0],)
@@ -0,0 +1,131 @@
+# distutils: language = c++
+#cython: language_level=3
+#cython: boundscheck=False, wraparound=False, initializedcheck=False, cdivision=True
+
+# Kernels for computing the affinity (i.e. proximity) matrix of the samples
+# from the leaves they fall into.
+
+import numpy as np
+
+cimport numpy as cnp
+from cython.parallel cimport prange
+from libc.string cimport memcpy
+
+cnp.import_array()
+
+
+ctypedef fused count_t:
+    cnp.uint8_t
+    cnp.uint16_t
+    cnp.uint32_t
+
+
+def _accumulate_affinity(
+    const cnp.intp_t[:, ::1] leaf_index,
+    const cnp.intp_t[::1] order,
+    const cnp.intp_t[::1] bounds,
+    count_t[:, ::1] out,
+    int n_threads=1,
+):
+    """Add the leaf co-occurrences of one or more trees into an affinity matrix.
+
+    For every tree and every sample ``i``, ``out[i, j]`` is incremented for each
+    sample ``j`` in the same leaf of the tree as ``i``. The leaves of all trees
+    are numbered consecutively, so that a single grouping describes the whole
+    forest. See ``_group_by_leaf`` in ``_classes.py`` for a description of the
+    grouping arrays.
+
+    Parameters
+    ----------
+    leaf_index : ndarray of shape (n_trees, n_samples)
+        The group (i.e. leaf) of each sample in each tree.
+    order : ndarray of shape (n_trees * n_samples,)
+        The sample indices sorted by group.
+    bounds : ndarray of shape (n_groups + 1,)
+        The boundaries of each group in ``order``.
+    out : ndarray of shape (n_samples, n_samples)
+        The co-occurrence counts to accumulate into. An unsigned integer dtype
+        large enough to hold the number of trees is used.
+    n_threads : int, default=1
+        The number of OpenMP threads to use.
+
+    Notes
+    -----
+    Rows are distributed over the threads, so each thread writes to a disjoint
+    band of ``out`` and no synchronization is required. All trees are handled
+    within the same parallel loop, so each thread keeps accumulating into the
+    same rows rather than the threads being re-dispatched for every tree.
+
+    Although ``out`` is symmetric, both triangles are written. Only the
+    ``sum(leaf_size**2)`` entries that share a leaf are touched, which for
+    typical leaf sizes is far fewer than the ``n_samples**2`` entries that
+    mirroring a triangle would read and write.
+    """
+    cdef cnp.intp_t n_trees = leaf_index.shape[0]
+    cdef cnp.intp_t n_samples = leaf_index.shape[1]
+    cdef cnp.intp_t i, t, p, leaf
+    cdef count_t* row
+
+    for i in prange(n_samples, nogil=True, schedule='static', num_threads=n_threads):
+        # hoist the row out of the inner loops, which then only index into it
+        row = &out[i, 0]
+        for t in range(n_trees):
+            leaf = leaf_index[t, i]
+            for p in range(bounds[leaf], bounds[leaf + 1]):
+                row[order[p]] += 1
+
+
+def _sparse_affinity(
+    const cnp.intp_t[::1] leaf_index,
+    const cnp.intp_t[::1] order,
+    const cnp.intp_t[::1] bounds,
+    int n_threads=1,
+):
+    """Build the CSR structure of the affinity matrix of a single tree.
+
+    Row ``i`` of the affinity matrix contains all samples in the same group as
+    sample ``i``, which is the run of ``order`` for that group. See
+    ``_group_by_leaf`` in ``_classes.py`` for a description of the grouping
+    arrays.
+
+    Parameters
+    ----------
+    leaf_index : ndarray of shape (n_samples,)
+        The group (i.e. leaf) of each sample.
+    order : ndarray of shape (n_samples,)
+        The sample indices sorted by group, in increasing order within each
+        group.
+    bounds : ndarray of shape (n_groups + 1,)
+        The boundaries of each group in ``order``.
+    n_threads : int, default=1
+        The number of OpenMP threads to use.
+
+    Returns
+    -------
+    indptr : ndarray of shape (n_samples + 1,)
+        The CSR row pointers.
+    indices : ndarray of shape (nnz,)
+        The CSR column indices, sorted within each row.
+    """
+    cdef cnp.intp_t n_samples = leaf_index.shape[0]
+    cdef cnp.intp_t i, leaf
+    cdef cnp.intp_t[::1] indptr = np.empty(n_samples + 1, dtype=np.intp)
+    cdef cnp.intp_t[::1] indices
+
+    with nogil:
+        indptr[0] = 0
+        for i in range(n_samples):
+            leaf = leaf_index[i]
+            indptr[i + 1] = indptr[i] + bounds[leaf + 1] - bounds[leaf]
+
+    indices = np.empty(indptr[n_samples], dtype=np.intp)
+    for i in prange(n_samples, nogil=True, schedule='static', num_threads=n_threads):
+        # the row is a contiguous run of ``order``, so copy it as a block
+        leaf = leaf_index[i]
+        memcpy(
+            &indices[indptr[i]],
+            &order[bounds[leaf]],
+            (bounds[leaf + 1] - bounds[leaf]) * sizeof(cnp.intp_t),
+        )
+
+    return np.asarray(indptr), np.asarray(indices)
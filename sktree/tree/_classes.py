@@ -2,14 +2,15 @@ import copy
 from numbers import Integral, Real
 
 import numpy as np
-from scipy.sparse import issparse
+from scipy.sparse import csr_matrix, issparse
 from sklearn.base import ClusterMixin, TransformerMixin, is_classifier
 from sklearn.cluster import AgglomerativeClustering
 from sklearn.tree import BaseDecisionTree, DecisionTreeClassifier, _criterion
 from sklearn.tree import _tree as _sklearn_tree
 from sklearn.tree._criterion import BaseCriterion
 from sklearn.tree._tree import BestFirstTreeBuilder, DepthFirstTreeBuilder
-from sklearn.utils._param_validation import Interval
+from sklearn.utils._openmp_helpers import _openmp_effective_n_threads
+from sklearn.utils._param_validation import Interval, StrOptions
 from sklearn.utils.validation import check_is_fitted
 
 from . import (  # type: ignore
@@ -19,9 +20,10 @@ from . import (  # type: ignore
     _unsup_oblique_splitter,
     _unsup_splitter,
 )
+from ._affinity import _sparse_affinity
 from ._morf_splitter import PatchSplitter
 from ._oblique_splitter import ObliqueSplitter
-from ._oblique_tree import ObliqueTree
+from ._oblique_tree import ObliqueTree, ParallelTreeBuilder
 from ._unsup_criterion import UnsupervisedCriterion
 from ._unsup_oblique_splitter import UnsupervisedObliqueSplitter
 from ._unsup_oblique_tree import UnsupervisedObliqueTree
@@ -47,6 +49,9 @@ CRITERIA_REG = {
     "poisson": _criterion.Poisson,
 }
 
+# the stock criteria, whose state is given by the arguments of their constructor
+STOCK_CRITERIA = frozenset(CRITERIA_CLF.values()) | frozenset(CRITERIA_REG.values())
+
 
 OBLIQUE_DENSE_SPLITTERS = {
     "best": _oblique_splitter.BestObliqueSplitter,
@@ -64,6 +69,228 @@ UNSUPERVISED_SPLITTERS = {
 UNSUPERVISED_OBLIQUE_SPLITTERS = {"best": _unsup_oblique_splitter.BestObliqueUnsupervisedSplitter}
 
 
+def _group_by_leaf(X_leaves, n_nodes=None):
+    """Group the samples by the leaf they fall into.
+
+    Parameters
+    ----------
+    X_leaves : ndarray of shape (n_samples,)
+        The index of the leaf each sample ends up in.
+    n_nodes : int, optional
+        The number of nodes in the tree. If given, the leaf indices are used
+        as the groups directly, which avoids sorting them to find the unique
+        leaves. Groups of nodes that no sample ends up in are then empty.
+
+    Returns
+    -------
+    leaf_index : ndarray of shape (n_samples,)
+        The group of each sample.
+    order : ndarray of shape (n_samples,)
+        The sample indices sorted by group. The samples of group ``k`` are
+        ``order[bounds[k]:bounds[k + 1]]``, in increasing order.
+    bounds : ndarray of shape (n_groups + 1,)
+        The boundaries of each group in ``order``.
+    """
+    if n_nodes is None:
+        leaf_index = np.unique(X_leaves, return_inverse=True)[1].ravel()
+        n_nodes = 0
+    else:
+        # the nodes are indexed by small integers bounded by the node count
+        leaf_index = np.ascontiguousarray(X_leaves, dtype=np.intp)
+    order = np.argsort(leaf_index, kind="stable")
+
+    counts = np.bincount(leaf_index, minlength=n_nodes)
+    bounds = np.zeros(counts.shape[0] + 1, dtype=np.intp)
+    np.cumsum(counts, out=bounds[1:])
+    return leaf_index, order, bounds
+
+
+def _affinity_from_groups(leaf_index, order, bounds):
+    """Build the sparse affinity matrix of samples grouped by leaf.
+
+    Parameters
+    ----------
+    leaf_index : ndarray of shape (n_samples,)
+        The group of each sample.
+    order : ndarray of shape (n_samples,)
+        The sample indices sorted by group, in increasing order within each
+        group.
+    bounds : ndarray of shape (n_groups + 1,)
+        The boundaries of each group in ``order``.
+
+    Returns
+    -------
+    prox_matrix : sparse matrix of shape (n_samples, n_samples)
+        The proximity matrix in CSR format.
+    """
+    n_samples = leaf_index.shape[0]
+    indptr, indices = _sparse_affinity(leaf_index, order, bounds)
+    data = np.ones(indices.shape[0], dtype=np.uint8)
+
+    return csr_matrix((data, indices, indptr), shape=(n_samples, n_samples))
+
+
+def _affinity_embedding(affinity_matrix):
+    """Embed the rows of a sparse tree affinity matrix in one dimension per leaf.
+
+    The row of a sample in the affinity matrix of a single tree is the indicator
+    vector of the samples in its leaf. Two rows are therefore equal if their
+    samples share a leaf, and orthogonal otherwise. Representing each sample
+    by the square root of its leaf size along a dimension dedicated to its leaf
+    preserves all inner products, and hence all Euclidean distances, between
+    the rows, while only using ``n_leaves`` rather than ``n_samples`` columns.
+
+    Parameters
+    ----------
+    affinity_matrix : sparse matrix of shape (n_samples, n_samples)
+        The 0-1 affinity matrix of a single tree.
+
+    Returns
+    -------
+    embedding : ndarray of shape (n_samples, n_leaves)
+        The embedding of the rows of the affinity matrix.
+    """
+    affinity_matrix = csr_matrix(affinity_matrix)
+    n_samples = affinity_matrix.shape[0]
+
+    # each row contains at least the sample itself, and the smallest sample of
+    # a leaf identifies it
+    leaf_sizes = np.diff(affinity_matrix.indptr)
+    first_samples = np.minimum.reduceat(affinity_matrix.indices, affinity_matrix.indptr[:-1])
+    leaf_index = np.unique(first_samples, return_inverse=True)[1].ravel()
+
+    embedding = np.zeros((n_samples, leaf_index.max() + 1), dtype=np.float64)
+    embedding[np.arange(n_samples), leaf_index] = np.sqrt(leaf_sizes)
+    return embedding
+
+
+def _is_euclidean_agglomerative(cluster):
+    """Whether a clustering estimator is agglomerative with Euclidean distances."""
+    if not isinstance(cluster, AgglomerativeClustering):
+        return False
+
+    # ``affinity`` is the deprecated name of ``metric`` in older scikit-learn
+    params = cluster.get_params()
+    metric = params.get("metric")
+    affinity = params.get("affinity", "deprecated")
+    return metric in (None, "euclidean") and affinity in ("deprecated", "euclidean")
+
+
+def _clone_criterion(criterion):
+    """Return a new criterion of the same type and with the same state.
+
+    The stock scikit-learn criteria are made anew from the arguments they are
+    pickled with, which is equivalent to, but much cheaper than,
+    ``copy.deepcopy``. Other criteria may have state of their own, and are
+    deep-copied.
+    """
+    if type(criterion) in STOCK_CRITERIA:
+        criterion_class, args = criterion.__reduce__()[:2]
+        return criterion_class(*args)
+    return copy.deepcopy(criterion)
+
+
+def _check_patch_geometry(estimator, n_features):
+    """Check the data and patch dimensions of a patch estimator.
+
+    Parameters
+    ----------
+    estimator : PatchObliqueDecisionTreeClassifier or PatchObliqueRandomForestClassifier
+        The estimator, whose patch parameters are checked.
+    n_features : int
+        The number of features of the data.
+
+    Returns
+    -------
+    data_height : int
+        The height of the data.
+    data_width : int
+        The width of the data, which is ``n_features`` if ``data_width`` is None.
+    """
+    data_height = estimator.data_height
+    data_width = n_features if estimator.data_width is None else estimator.data_width
+
+    if data_height * data_width != n_features:
+        raise RuntimeError(
+            f"The passed in data height ({estimator.data_height}) and "
+            f"width ({estimator.data_width}) does not equal the number of "
+            f"columns in X ({n_features})"
+        )
+
+    # validate patch parameters
+    if estimator.min_patch_height > estimator.max_patch_height:
+        raise RuntimeError(
+            f"The minimum patch height {estimator.min_patch_height} is "
+            f"greater than the maximum patch height {estimator.max_patch_height}"
+        )
+    if estimator.min_patch_width > estimator.max_patch_width:
+        raise RuntimeError(
+            f"The minimum patch width {estimator.min_patch_width} is "
+            f"greater than the maximum patch width {estimator.max_patch_width}"
+        )
+    if estimator.max_patch_width > data_width:
+        raise RuntimeError(
+            f"The maximum patch width {estimator.max_patch_width} is "
+            f"greater than the data width {data_width}"
+        )
+    if estimator.max_patch_height > data_height:
+        raise RuntimeError(
+            f"The maximum patch height {estimator.max_patch_height} is "
+            f"greater than the data height {data_height}"
+        )
+    return data_height, data_width
+
+
+def _oblique_tree_builder(
+    splitter,
+    n_jobs,
+    min_samples_split,
+    min_samples_leaf,
+    min_weight_leaf,
+    max_depth,
+    max_leaf_nodes,
+    min_impurity_decrease,
+):
+    """Make the builder of an oblique tree.
+
+    Depth-first trees with more than one job are grown level by level, with
+    each thread splitting nodes with its own copy of ``splitter``. Best-first
+    trees are always grown serially, since they only split one node at a time.
+    """
+    # Use BestFirst if max_leaf_nodes given; use DepthFirst otherwise
+    if max_leaf_nodes >= 0:
+        return BestFirstTreeBuilder(
+            splitter,
+            min_samples_split,
+            min_samples_leaf,
+            min_weight_leaf,
+            max_depth,
+            max_leaf_nodes,
+            min_impurity_decrease,
+        )
+
+    if n_jobs is None or n_jobs == 1:
+        return DepthFirstTreeBuilder(
+            splitter,
+            min_samples_split,
+            min_samples_leaf,
+            min_weight_leaf,
+            max_depth,
+            min_impurity_decrease,
+        )
+
+    n_threads = _openmp_effective_n_threads(n_jobs)
+    splitters = [splitter] + [copy.deepcopy(splitter) for _ in range(n_threads - 1)]
+    return ParallelTreeBuilder(
+        splitters,
+        min_samples_split,
+        min_samples_leaf,
+        min_weight_leaf,
+        max_depth,
+        min_impurity_decrease,
+    )
+
+
 class UnsupervisedDecisionTree(TransformerMixin, ClusterMixin, BaseDecisionTree):
     """Unsupervised decision tree.
 
@@ -153,6 +380,19 @@ class UnsupervisedDecisionTree(TransformerMixin, ClusterMixin, BaseDecisionTree)
         Clustering function class keyword arguments. Passed to `clustering_func`.
     """
 
+    _parameter_constraints = {
+        **BaseDecisionTree._parameter_constraints,
+        "criterion": [StrOptions(set(UNSUPERVISED_CRITERIA.keys())), UnsupervisedCriterion],
+        "splitter": [StrOptions(set(UNSUPERVISED_SPLITTERS.keys())), UnsupervisedSplitter],
+        "clustering_func": [callable, None],
+        "clustering_func_args": [dict, None],
+    }
+    _parameter_constraints.pop("ccp_alpha")
+
+    # the criteria and splitters that can be selected by name
+    _criteria = UNSUPERVISED_CRITERIA
+    _splitters = UNSUPERVISED_SPLITTERS
+
     def __init__(
         self,
         *,
@@ -186,10 +426,14 @@ class UnsupervisedDecisionTree(TransformerMixin, ClusterMixin, BaseDecisionTree)
         self.clustering_func_args = clustering_func_args
 
     def fit(self, X, y=None, sample_weight=None, check_input=True):
+        self._validate_params()
+
         if check_input:
             # TODO: allow X to be sparse
+            # convert X to DTYPE once here, so that building the tree and
+            # applying it to the training data do not each make a copy
             check_X_params = dict(dtype=DTYPE)  # , accept_sparse="csc"
-            X = self._validate_data(X, validate_separately=(check_X_params))
+            X = self._validate_data(X, **check_X_params)
             if issparse(X):
                 X.sort_indices()
 
@@ -198,12 +442,12 @@ class UnsupervisedDecisionTree(TransformerMixin, ClusterMixin, BaseDecisionTree)
 
         super().fit(X, None, sample_weight, check_input)
 
-        # apply to the leaves
+        # apply to the leaves and group the samples by leaf in a single pass
         n_samples = X.shape[0]
-        X_leaves = self.apply(X)
+        leaves, order, bounds = self._apply_and_group(X)
 
         # now compute the affinity matrix and set it
-        self.affinity_matrix_ = self._compute_affinity_matrix(X_leaves)
+        self.affinity_matrix_ = _affinity_from_groups(leaves, order, bounds)
 
         # compute the labels and set it
         if n_samples >= 2:
@@ -225,15 +469,15 @@ class UnsupervisedDecisionTree(TransformerMixin, ClusterMixin, BaseDecisionTree)
     ):
         criterion = self.criterion
         if not isinstance(criterion, UnsupervisedCriterion):
-            criterion = UNSUPERVISED_CRITERIA[self.criterion]()
+            criterion = self._criteria[criterion]()
         else:
-            # Make a deepcopy in case the criterion has mutable attributes that
+            # Make a copy in case the criterion has mutable attributes that
             # might be shared and modified concurrently during parallel fitting
-            criterion = copy.deepcopy(criterion)
+            criterion = criterion.clone()
 
         splitter = self.splitter
-        if not isinstance(self.splitter, UnsupervisedSplitter):
-            splitter = UNSUPERVISED_SPLITTERS[self.splitter](
+        if not isinstance(splitter, UnsupervisedSplitter):
+            splitter = self._splitters[splitter](
                 criterion,
                 self.max_features_,
                 min_samples_leaf,
@@ -281,9 +525,8 @@ class UnsupervisedDecisionTree(TransformerMixin, ClusterMixin, BaseDecisionTree)
         labels : array-like of shape (n_samples,)
             The assigned labels for each sample.
         """
-
-        X = self._validate_X_predict(X, check_input=check_input)
-        affinity_matrix = self.transform(X)
+        check_is_fitted(self)
+        affinity_matrix = self._transform_sparse(X, check_input=check_input)
 
         # compute the labels and set it
         return self._assign_labels(affinity_matrix)
@@ -306,16 +549,73 @@ class UnsupervisedDecisionTree(TransformerMixin, ClusterMixin, BaseDecisionTree)
             X transformed in the new space.
         """
         check_is_fitted(self)
-        # apply to the leaves
-        X_leaves = self.apply(X)
+        return self._transform_sparse(X).toarray()
 
-        # now compute the affinity matrix and set it
-        affinity_matrix = self._compute_affinity_matrix(X_leaves)
-        return affinity_matrix
+    def fit_transform(self, X, y=None, sample_weight=None):
+        """Fit the tree and transform X to a cluster-distance space.
+
+        The affinity matrix of X is computed when fitting, so it is returned
+        rather than computed again by ``transform``.
+
+        Parameters
+        ----------
+        X : {array-like, sparse matrix} of shape (n_samples, n_features)
+            The training input samples.
+        y : Ignored
+            Not used, present for API consistency by convention.
+        sample_weight : array-like of shape (n_samples,), default=None
+            Sample weights. If None, then samples are equally weighted.
+
+        Returns
+        -------
+        X_new : ndarray of shape (n_samples, n_samples)
+            X transformed in the new space.
+        """
+        return self.fit(X, y, sample_weight).affinity_matrix_.toarray()
+
+    def _transform_sparse(self, X, check_input=True):
+        """Transform X into its sparse affinity matrix."""
+        # apply to the leaves and group the samples by leaf in a single pass
+        leaves, order, bounds = self._apply_and_group(X, check_input=check_input)
+
+        # now compute the affinity matrix
+        return _affinity_from_groups(leaves, order, bounds)
+
+    def _apply_and_group(self, X, check_input=True):
+        """Return the leaf of each sample in X, and the samples grouped by leaf.
+
+        See ``UnsupervisedTree._apply_and_group`` for details.
+        """
+        if not self._is_valid_dense(X):
+            X = self._validate_X_predict(X, check_input)
+        return self.tree_._apply_and_group(X)
+
+    def _is_valid_dense(self, X):
+        """Whether X is a dense array that would pass validation unchanged.
+
+        This skips the overhead of the full input validation when X can be
+        passed to the tree as is, e.g. in repeated calls to ``transform``.
+        """
+        return (
+            type(X) is np.ndarray
+            and X.dtype == DTYPE
+            and X.ndim == 2
+            and X.shape[0] > 0
+            and X.shape[1] == self.n_features_in_
+            # feature names must be checked against the fitted ones
+            and not hasattr(self, "feature_names_in_")
+            # if the sum is finite, then so are all the entries
+            and np.isfinite(X.sum())
+        )
 
     def _compute_affinity_matrix(self, X_leaves):
         """Compute the proximity matrix of samples in X.
 
+        Two samples have an affinity of one if they fall into the same leaf and
+        zero otherwise, so the matrix is block-diagonal up to a permutation of the
+        samples. It is therefore stored sparsely, which only requires memory for
+        the sum of the squared leaf sizes rather than ``n_samples**2``.
+
         Parameters
         ----------
         X_leaves : ndarray of shape (n_samples,)
@@ -324,19 +624,11 @@ class UnsupervisedDecisionTree(TransformerMixin, ClusterMixin, BaseDecisionTree)
 
         Returns
         -------
-        prox_matrix : array-like of shape (n_samples, n_samples)
+        prox_matrix : sparse matrix of shape (n_samples, n_samples)
+            The proximity matrix in CSR format.
         """
-        n_samples = X_leaves.shape[0]
-        aff_matrix = np.zeros((n_samples, n_samples), dtype=np.int32)
-
-        # for every unique leaf in this dataset, count all co-occurrences of samples
-        # in the same leaf
-        for leaf in np.unique(X_leaves):
-            # find out which samples occur with this leaf
-            samples_in_leaf = np.atleast_1d(np.argwhere(X_leaves == leaf).squeeze())
-            aff_matrix[np.ix_(samples_in_leaf, samples_in_leaf)] += 1
-
-        return aff_matrix
+        leaf_index, order, bounds = _group_by_leaf(X_leaves, self.tree_.node_count)
+        return _affinity_from_groups(leaf_index, order, bounds)
 
     def _assign_labels(self, affinity_matrix):
         """Assign cluster labels given X.
@@ -361,6 +653,15 @@ class UnsupervisedDecisionTree(TransformerMixin, ClusterMixin, BaseDecisionTree)
             self.clustering_func_args_ = self.clustering_func_args
         cluster = self.clustering_func_(**self.clustering_func_args_)
 
+        if issparse(affinity_matrix):
+            if _is_euclidean_agglomerative(cluster):
+                # agglomerative clustering with Euclidean distances only depends on
+                # the distances between the rows, so cluster their compact embedding
+                affinity_matrix = _affinity_embedding(affinity_matrix)
+            else:
+                # clustering functions generally expect a dense array
+                affinity_matrix = affinity_matrix.toarray()
+
         # apply agglomerative clustering to obtain cluster labels
         predict_labels = cluster.fit_predict(affinity_matrix)
         return predict_labels
@@ -458,6 +759,17 @@ class UnsupervisedObliqueDecisionTree(UnsupervisedDecisionTree):
         Clustering function class keyword arguments. Passed to `clustering_func`.
     """
 
+    _parameter_constraints = {
+        **UnsupervisedDecisionTree._parameter_constraints,
+        "splitter": [
+            StrOptions(set(UNSUPERVISED_OBLIQUE_SPLITTERS.keys())),
+            UnsupervisedObliqueSplitter,
+        ],
+        "feature_combinations": [Interval(Real, 1.0, None, closed="left")],
+    }
+
+    _splitters = UNSUPERVISED_OBLIQUE_SPLITTERS
+
     def __init__(
         self,
         *,
@@ -507,15 +819,15 @@ class UnsupervisedObliqueDecisionTree(UnsupervisedDecisionTree):
 
         criterion = self.criterion
         if not isinstance(criterion, UnsupervisedCriterion):
-            criterion = UNSUPERVISED_CRITERIA[self.criterion]()
+            criterion = self._criteria[criterion]()
         else:
-            # Make a deepcopy in case the criterion has mutable attributes that
+            # Make a copy in case the criterion has mutable attributes that
             # might be shared and modified concurrently during parallel fitting
-            criterion = copy.deepcopy(criterion)
+            criterion = criterion.clone()
 
         splitter = self.splitter
-        if not isinstance(self.splitter, UnsupervisedObliqueSplitter):
-            splitter = UNSUPERVISED_OBLIQUE_SPLITTERS[self.splitter](
+        if not isinstance(splitter, UnsupervisedObliqueSplitter):
+            splitter = self._splitters[splitter](
                 criterion,
                 self.max_features_,
                 min_samples_leaf,
@@ -679,6 +991,17 @@ class ObliqueDecisionTreeClassifier(DecisionTreeClassifier):
         ``(max_features, n_features)``. Thus this value must always be less than
         ``n_features`` in order to be valid.
 
+    n_jobs : int, default=None
+        The number of threads used to build the tree. ``None`` means 1 and ``-1``
+        means using all processors. The sampled projections of the samples in
+        large nodes are computed with several OpenMP threads. Unless
+        ``max_leaf_nodes`` is given, the tree is also grown level by level, with
+        the nodes of each level split in parallel. Such a tree does not depend on
+        ``n_jobs``, but differs from the tree grown depth-first with
+        ``n_jobs=None`` or ``n_jobs=1``. Forests parallelize over their trees
+        instead, so the trees of a forest should keep the default to avoid
+        oversubscription.
+
     Attributes
     ----------
     classes_ : ndarray of shape (n_classes,) or list of ndarray
@@ -736,6 +1059,11 @@ class ObliqueDecisionTreeClassifier(DecisionTreeClassifier):
     always recommended to sample more if one is willing to spend the
     computational resources.
 
+    Sparse projections are computed one feature at a time over the samples of a
+    node. Passing ``X`` in Fortran order (e.g. with :func:`numpy.asfortranarray`)
+    makes these reads contiguous and speeds up fitting when ``n_features`` is
+    large; ``X`` is not copied into that layout internally.
+
     The default values for the parameters controlling the size of the trees
     (e.g. ``max_depth``, ``min_samples_leaf``, etc.) lead to fully grown and
     unpruned trees which can potentially be very large on some data sets. To
@@ -781,6 +1109,7 @@ class ObliqueDecisionTreeClassifier(DecisionTreeClassifier):
             Interval(Real, 1.0, None, closed="left"),
             None,
         ],
+        "n_jobs": [Integral, None],
     }
 
     def __init__(
@@ -798,6 +1127,7 @@ class ObliqueDecisionTreeClassifier(DecisionTreeClassifier):
         min_impurity_decrease=0.0,
         class_weight=None,
         feature_combinations=None,
+        n_jobs=None,
     ):
         super().__init__(
             criterion=criterion,
@@ -814,6 +1144,7 @@ class ObliqueDecisionTreeClassifier(DecisionTreeClassifier):
         )
 
         self.feature_combinations = feature_combinations
+        self.n_jobs = n_jobs
 
     def _build_tree(
         self,
@@ -859,6 +1190,7 @@ class ObliqueDecisionTreeClassifier(DecisionTreeClassifier):
             Controls the randomness of the estimator.
         """
         n_samples, n_features = X.shape
+        is_classification = is_classifier(self)
 
         if self.feature_combinations is None:
             self.feature_combinations_ = min(n_features, 1.5)
@@ -873,14 +1205,14 @@ class ObliqueDecisionTreeClassifier(DecisionTreeClassifier):
         # Build tree
         criterion = self.criterion
         if not isinstance(criterion, BaseCriterion):
-            if is_classifier(self):
+            if is_classification:
                 criterion = CRITERIA_CLF[self.criterion](self.n_outputs_, self.n_classes_)
             else:
                 criterion = CRITERIA_REG[self.criterion](self.n_outputs_, n_samples)
         else:
-            # Make a deepcopy in case the criterion has mutable attributes that
+            # Make a copy in case the criterion has mutable attributes that
             # might be shared and modified concurrently during parallel fitting
-            criterion = copy.deepcopy(criterion)
+            criterion = _clone_criterion(criterion)
 
         splitter = self.splitter
         if issparse(X):
@@ -900,8 +1232,11 @@ class ObliqueDecisionTreeClassifier(DecisionTreeClassifier):
                 random_state,
                 self.feature_combinations_,
             )
+            # unlike joblib, sklearn's OpenMP helper maps None to all threads
+            if self.n_jobs is not None:
+                splitter.n_threads = _openmp_effective_n_threads(self.n_jobs)
 
-        if is_classifier(self):
+        if is_classification:
             self.tree_ = ObliqueTree(self.n_features_in_, self.n_classes_, self.n_outputs_)
         else:
             self.tree_ = ObliqueTree(
@@ -911,30 +1246,19 @@ class ObliqueDecisionTreeClassifier(DecisionTreeClassifier):
                 self.n_outputs_,
             )
 
-        # Use BestFirst if max_leaf_nodes given; use DepthFirst otherwise
-        if max_leaf_nodes < 0:
-            builder = DepthFirstTreeBuilder(
-                splitter,
-                min_samples_split,
-                min_samples_leaf,
-                min_weight_leaf,
-                max_depth,
-                self.min_impurity_decrease,
-            )
-        else:
-            builder = BestFirstTreeBuilder(
-                splitter,
-                min_samples_split,
-                min_samples_leaf,
-                min_weight_leaf,
-                max_depth,
-                max_leaf_nodes,
-                self.min_impurity_decrease,
-            )
-
+        builder = _oblique_tree_builder(
+            splitter,
+            self.n_jobs,
+            min_samples_split,
+            min_samples_leaf,
+            min_weight_leaf,
+            max_depth,
+            max_leaf_nodes,
+            self.min_impurity_decrease,
+        )
         builder.build(self.tree_, X, y, sample_weight)
 
-        if self.n_outputs_ == 1 and is_classifier(self):
+        if self.n_outputs_ == 1 and is_classification:
             self.n_classes_ = self.n_classes_[0]
             self.classes_ = self.classes_[0]
 
@@ -1075,6 +1399,15 @@ class PatchObliqueDecisionTreeClassifier(DecisionTreeClassifier):
         The presumed height of the un-vectorized feature vector, by default None.
         If None, the data width will be presumed the number of columns in ``X``
         passed to :meth:`fit`.
+    n_jobs : int, default=None
+        The number of threads used to build the tree. ``None`` means 1 and ``-1``
+        means using all processors. The patches of the samples in large nodes
+        are summed with several OpenMP threads. Unless ``max_leaf_nodes`` is
+        given, the tree is also grown level by level, with the nodes of each
+        level split in parallel. Such a tree does not depend on ``n_jobs``, but
+        differs from the tree grown depth-first with ``n_jobs=None`` or
+        ``n_jobs=1``. Forests parallelize over their trees instead, so the trees
+        of a forest should keep the default to avoid oversubscription.
 
     Notes
     -----
@@ -1106,6 +1439,7 @@ class PatchObliqueDecisionTreeClassifier(DecisionTreeClassifier):
         "max_patch_width": [Interval(Integral, 1, None, closed="left")],
         "data_width": [Interval(Integral, 1, None, closed="left"), None],
         "data_height": [Interval(Integral, 1, None, closed="left")],
+        "n_jobs": [Integral, None],
     }
 
     def __init__(
@@ -1128,6 +1462,7 @@ class PatchObliqueDecisionTreeClassifier(DecisionTreeClassifier):
         max_patch_width=1,
         data_height=1,
         data_width=None,
+        n_jobs=None,
     ):
         super().__init__(
             criterion=criterion,
@@ -1149,6 +1484,7 @@ class PatchObliqueDecisionTreeClassifier(DecisionTreeClassifier):
         self.max_patch_width = max_patch_width
         self.data_height = data_height
         self.data_width = data_width
+        self.n_jobs = n_jobs
 
     def fit(self, X, y, sample_weight=None, check_input=True):
         """Fit tree.
@@ -1170,6 +1506,9 @@ class PatchObliqueDecisionTreeClassifier(DecisionTreeClassifier):
         check_input : bool, optional
             Whether or not to check input, by default True.
         """
+        # a patch forest checks the patch dimensions once for all of its trees
+        # and hands them to each tree for the next fit only
+        patch_geometry = self.__dict__.pop("_patch_geometry", None)
 
         if check_input:
             # Need to validate separately here.
@@ -1200,41 +1539,15 @@ class PatchObliqueDecisionTreeClassifier(DecisionTreeClassifier):
                         "Sum of y is not positive which is " "necessary for Poisson regression."
                     )
 
-        # validate data height/width
-        if self.data_width is None:
-            self.data_width_ = X.shape[1]
-        else:
-            self.data_width_ = self.data_width
-        self.data_height_ = self.data_height
-
-        if self.data_height_ * self.data_width_ != X.shape[1]:
+        if patch_geometry is None:
+            patch_geometry = _check_patch_geometry(self, X.shape[1])
+        elif patch_geometry[0] * patch_geometry[1] != X.shape[1]:
             raise RuntimeError(
-                f"The passed in data height ({self.data_height}) and "
-                f"width ({self.data_width}) does not equal the number of "
+                f"The passed in data height ({patch_geometry[0]}) and "
+                f"width ({patch_geometry[1]}) does not equal the number of "
                 f"columns in X ({X.shape[1]})"
             )
-
-        # validate patch parameters
-        if self.min_patch_height > self.max_patch_height:
-            raise RuntimeError(
-                f"The minimum patch height {self.min_patch_height} is "
-                f"greater than the maximum patch height {self.max_patch_height}"
-            )
-        if self.min_patch_width > self.max_patch_width:
-            raise RuntimeError(
-                f"The minimum patch width {self.min_patch_width} is "
-                f"greater than the maximum patch width {self.max_patch_width}"
-            )
-        if self.max_patch_width > self.data_width_:
-            raise RuntimeError(
-                f"The maximum patch width {self.max_patch_width} is "
-                f"greater than the data width {self.data_width_}"
-            )
-        if self.max_patch_height > self.data_height_:
-            raise RuntimeError(
-                f"The maximum patch height {self.max_patch_height} is "
-                f"greater than the data height {self.data_height_}"
-            )
+        self.data_height_, self.data_width_ = patch_geometry
 
         return super().fit(X, y, sample_weight, check_input=False)
 
@@ -1283,18 +1596,19 @@ class PatchObliqueDecisionTreeClassifier(DecisionTreeClassifier):
         """
 
         n_samples = X.shape[0]
+        is_classification = is_classifier(self)
 
         # Build tree
         criterion = self.criterion
         if not isinstance(criterion, BaseCriterion):
-            if is_classifier(self):
+            if is_classification:
                 criterion = CRITERIA_CLF[self.criterion](self.n_outputs_, self.n_classes_)
             else:
                 criterion = CRITERIA_REG[self.criterion](self.n_outputs_, n_samples)
         else:
-            # Make a deepcopy in case the criterion has mutable attributes that
+            # Make a copy in case the criterion has mutable attributes that
             # might be shared and modified concurrently during parallel fitting
-            criterion = copy.deepcopy(criterion)
+            criterion = _clone_criterion(criterion)
 
         splitter = self.splitter
         if issparse(X):
@@ -1319,8 +1633,11 @@ class PatchObliqueDecisionTreeClassifier(DecisionTreeClassifier):
                 self.data_height_,
                 self.data_width_,
             )
+            # unlike joblib, sklearn's OpenMP helper maps None to all threads
+            if self.n_jobs is not None:
+                splitter.n_threads = _openmp_effective_n_threads(self.n_jobs)
 
-        if is_classifier(self):
+        if is_classification:
             self.tree_ = ObliqueTree(self.n_features_in_, self.n_classes_, self.n_outputs_)
         else:
             self.tree_ = ObliqueTree(
@@ -1330,29 +1647,18 @@ class PatchObliqueDecisionTreeClassifier(DecisionTreeClassifier):
                 self.n_outputs_,
             )
 
-        # Use BestFirst if max_leaf_nodes given; use DepthFirst otherwise
-        if max_leaf_nodes < 0:
-            builder = DepthFirstTreeBuilder(
-                splitter,
-                min_samples_split,
-                min_samples_leaf,
-                min_weight_leaf,
-                max_depth,
-                self.min_impurity_decrease,
-            )
-        else:
-            builder = BestFirstTreeBuilder(
-                splitter,
-                min_samples_split,
-                min_samples_leaf,
-                min_weight_leaf,
-                max_depth,
-                max_leaf_nodes,
-                self.min_impurity_decrease,
-            )
-
+        builder = _oblique_tree_builder(
+            splitter,
+            self.n_jobs,
+            min_samples_split,
+            min_samples_leaf,
+            min_weight_leaf,
+            max_depth,
+            max_leaf_nodes,
+            self.min_impurity_decrease,
+        )
         builder.build(self.tree_, X, y, sample_weight)
 
-        if self.n_outputs_ == 1 and is_classifier(self):
+        if self.n_outputs_ == 1 and is_classification:
             self.n_classes_ = self.n_classes_[0]
             self.classes_ = self.classes_[0]
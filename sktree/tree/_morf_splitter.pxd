@@ -36,6 +36,12 @@ cdef class PatchSplitter(BaseObliqueSplitter):
     cdef public SIZE_t data_height                      # Height of the input data
     cdef public SIZE_t data_width                       # Width of the input data
 
+    # Buffers to compute the sums of the sampled patches from summed-area tables
+    cdef SIZE_t[:, ::1] patch_corners                   # corners of each patch in a summed-area table
+    cdef double* sat_pool                               # summed-area tables of a block of samples per thread,
+                                                        # allocated by the first node that uses them
+    cdef SIZE_t sat_block_size                          # number of samples of a block
+
     # All oblique splitters (i.e. non-axis aligned splitters) require a
     # function to sample a projection matrix that is applied to the feature matrix
     # to quickly obtain the sampled projections for candidate splits.
@@ -44,3 +50,13 @@ cdef class PatchSplitter(BaseObliqueSplitter):
         vector[vector[DTYPE_t]]& proj_mat_weights,
         vector[vector[SIZE_t]]& proj_mat_indices
     ) nogil 
+
+    cdef SIZE_t sat_size(self) noexcept nogil
+    cdef bint dense_projection_pays_off(self) noexcept nogil
+    cdef void project_dense(
+        self,
+        SIZE_t start,
+        SIZE_t end,
+        SIZE_t proj_start,
+        SIZE_t proj_end
+    ) noexcept nogil
@@ -4,12 +4,70 @@ cimport numpy as cnp
 
 cnp.import_array()
 
-from libc.math cimport floor
+import numpy as np
+
+from cython.parallel cimport prange, threadid
+from libc.stdlib cimport calloc, free
+from libc.string cimport memcpy
 from libcpp.vector cimport vector
 from sklearn.tree._criterion cimport Criterion
 from sklearn.tree._utils cimport rand_int
 
 
+# Minimum number of samples in a node for its patches to be summed with several
+# threads, as for the projections in _oblique_splitter.pyx
+cdef SIZE_t MIN_PARALLEL_SAMPLES = 10000
+
+# Maximum number of samples whose summed-area tables are computed at once by a
+# thread, and maximum number of doubles in these tables, which holds unless the
+# table of a single sample is larger, so that large images need fewer tables
+cdef SIZE_t SAT_BLOCK_SIZE = 64
+cdef SIZE_t SAT_BLOCK_MAX_SIZE = 32768
+
+
+cdef inline void _sum_patches(
+    const DTYPE_t[:, :] X,
+    const SIZE_t* samples,
+    SIZE_t n_block_samples,
+    SIZE_t data_height,
+    SIZE_t data_width,
+    const SIZE_t[:, ::1] patch_corners,
+    double* sat,
+    DTYPE_t* proj_values,
+    SIZE_t n_node_samples
+) noexcept nogil:
+    """Sum all sampled patches of a block of samples.
+
+    The summed-area table of the ``j``-th sample is computed in ``sat``, from
+    which the sum of the ``i``-th patch is stored in
+    ``proj_values[i * n_node_samples + j]``.
+    """
+    cdef SIZE_t sat_width = data_width + 1
+    cdef SIZE_t sat_size = (data_height + 1) * sat_width
+    cdef SIZE_t i, j, row, col
+    cdef double row_sum
+    cdef double* sample_sat
+
+    for j in range(n_block_samples):
+        # the first row and column of the table are always zero
+        sample_sat = sat + j * sat_size
+        for row in range(data_height):
+            row_sum = 0
+            for col in range(data_width):
+                row_sum += X[samples[j], row * data_width + col]
+                sample_sat[(row + 1) * sat_width + col + 1] = (
+                    sample_sat[row * sat_width + col + 1] + row_sum
+                )
+
+    for i in range(patch_corners.shape[0]):
+        for j in range(n_block_samples):
+            sample_sat = sat + j * sat_size
+            proj_values[i * n_node_samples + j] = (
+                sample_sat[patch_corners[i, 3]] - sample_sat[patch_corners[i, 1]]
+                - sample_sat[patch_corners[i, 2]] + sample_sat[patch_corners[i, 0]]
+            )
+
+
 cdef class PatchSplitter(BaseObliqueSplitter):
     """Patch splitter.
 
@@ -52,6 +110,12 @@ cdef class PatchSplitter(BaseObliqueSplitter):
         self.data_height = data_height
         self.data_width = data_width
 
+        self.sat_pool = NULL
+
+    def __dealloc__(self):
+        """Destructor."""
+        free(self.sat_pool)
+
     def __getstate__(self):
         return {}
 
@@ -66,8 +130,26 @@ cdef class PatchSplitter(BaseObliqueSplitter):
     ) except -1:
         BaseObliqueSplitter.init(self, X, y, sample_weight)
 
+        # the patches are summed from summed-area tables in the nodes where it
+        # pays off, see ``dense_projection_pays_off``
+        self.dense_projection = True
+        self.proj_values = np.empty(
+            self.n_dense_projections() * self.n_samples, dtype=np.float32
+        )
+        self.samples_snapshot = np.empty(self.n_samples, dtype=np.intp)
+        self.patch_corners = np.empty((self.n_dense_projections(), 4), dtype=np.intp)
+
+        # the summed-area tables are only allocated once a node uses them, which
+        # may be none of them
+        free(self.sat_pool)
+        self.sat_pool = NULL
+        self.sat_block_size = max(1, min(SAT_BLOCK_SIZE, SAT_BLOCK_MAX_SIZE // self.sat_size()))
         return 0
 
+    cdef SIZE_t sat_size(self) noexcept nogil:
+        """The number of doubles of the summed-area table of a sample."""
+        return (self.data_height + 1) * (self.data_width + 1)
+
     cdef int node_reset(
         self,
         SIZE_t start,
@@ -113,11 +195,93 @@ cdef class PatchSplitter(BaseObliqueSplitter):
     ) noexcept nogil:
         """ Sample the projection vector.
 
-        This is a placeholder method.
+        This is a placeholder method. The indices of each patch must be sampled
+        in row-major order, which ``project_dense`` relies on.
 
         """
         pass
 
+    cdef bint dense_projection_pays_off(self) noexcept nogil:
+        """Whether to sum the sampled patches from summed-area tables.
+
+        Gathering the features of the patches of a sample costs about twice as
+        much per feature as computing its summed-area table, from which each
+        patch is then summed with four loads, so the tables pay off once the
+        patches cover at least half as many features as there are.
+
+        The tables are allocated here the first time they pay off, and the
+        patches are gathered instead if they cannot be allocated.
+        """
+        cdef SIZE_t patch_area = 0
+        cdef SIZE_t i
+
+        for i in range(self.max_features):
+            patch_area += self.proj_mat_indices[i].size()
+        if 2 * patch_area < self.n_features:
+            return False
+
+        if self.sat_pool == NULL:
+            # the first row and column of each table are zero and never written
+            self.sat_pool = <double*>calloc(
+                self.n_threads * self.sat_block_size * self.sat_size(), sizeof(double)
+            )
+        return self.sat_pool != NULL
+
+    cdef void project_dense(
+        self,
+        SIZE_t start,
+        SIZE_t end,
+        SIZE_t proj_start,
+        SIZE_t proj_end
+    ) noexcept nogil:
+        """Sum the sampled patches proj_start to proj_end of samples[start:end].
+
+        Blocks of the node's samples are distributed over the threads, which
+        compute the summed-area tables of their samples in their own part of
+        ``sat_pool``. The sums are stored as by the projections of
+        ``BaseObliqueSplitter.project_dense``.
+        """
+        cdef SIZE_t[::1] samples = self.samples
+        cdef const DTYPE_t[:, :] X = self.X
+        cdef SIZE_t[:, ::1] patch_corners = self.patch_corners[:proj_end - proj_start]
+        cdef double* sat_pool = self.sat_pool
+        cdef SIZE_t sat_block_size = self.sat_block_size
+        cdef SIZE_t thread_pool_size = sat_block_size * self.sat_size()
+        cdef DTYPE_t[::1] proj_values = self.proj_values
+        cdef SIZE_t data_height = self.data_height
+        cdef SIZE_t data_width = self.data_width
+        cdef SIZE_t sat_width = data_width + 1
+        cdef SIZE_t n_node_samples = end - start
+        cdef SIZE_t n_blocks = (n_node_samples + sat_block_size - 1) // sat_block_size
+        cdef SIZE_t i, block, block_start
+        cdef SIZE_t top, left, bottom, right
+        cdef int n_threads = (
+            self.n_node_threads if n_node_samples >= MIN_PARALLEL_SAMPLES else 1
+        )
+
+        # the first and last indices of a patch are its top-left and bottom-right
+        # points, which give its corners in the summed-area tables
+        for i in range(proj_start, proj_end):
+            top = self.proj_mat_indices[i].front() // data_width
+            left = self.proj_mat_indices[i].front() % data_width
+            bottom = self.proj_mat_indices[i].back() // data_width + 1
+            right = self.proj_mat_indices[i].back() % data_width + 1
+            patch_corners[i - proj_start, 0] = top * sat_width + left
+            patch_corners[i - proj_start, 1] = top * sat_width + right
+            patch_corners[i - proj_start, 2] = bottom * sat_width + left
+            patch_corners[i - proj_start, 3] = bottom * sat_width + right
+
+        memcpy(&self.samples_snapshot[0], &samples[start], n_node_samples * sizeof(SIZE_t))
+
+        for block in prange(n_blocks, schedule='static', num_threads=n_threads):
+            block_start = start + block * sat_block_size
+            _sum_patches(
+                X, &samples[block_start], min(sat_block_size, end - block_start),
+                data_height, data_width, patch_corners,
+                sat_pool + threadid() * thread_pool_size,
+                &proj_values[block_start - start], n_node_samples
+            )
+
     cdef int pointer_size(self) noexcept nogil:
         """Get size of a pointer to record for ObliqueSplitter."""
 
@@ -175,7 +339,7 @@ cdef class BestPatchSplitter(BaseDensePatchSplitter):
         cdef SIZE_t max_features = self.max_features
         cdef UINT32_t* random_state = &self.rand_r_state
 
-        cdef int feat_i, proj_i
+        cdef int proj_i, patch_row, patch_col
 
         # weights are default to 1
         cdef DTYPE_t weight = 1.
@@ -195,9 +359,10 @@ cdef class BestPatchSplitter(BaseDensePatchSplitter):
 
         # define parameters for vectorized points in the original data shape
         # and top-left seed
-        cdef SIZE_t vectorized_point
         cdef SIZE_t top_left_seed
-        cdef SIZE_t patch_end_seed
+        cdef SIZE_t top_left_point
+        cdef SIZE_t row_point
+        cdef SIZE_t* patch_indices
 
         for proj_i in range(0, max_features):
             # compute random patch width and height
@@ -217,21 +382,19 @@ cdef class BestPatchSplitter(BaseDensePatchSplitter):
             # position in patch
             top_left_seed = rand_int(0, delta_width * delta_height, random_state)
 
-            # Get the end-point of the patch
-            # Note: The end-point of the dataset might be less than the patch.
-            # This occurs if we sample a seed point at the edge of the "image".
-            # Therefore, we take the minimum between the end-point, or the last
-            # index in the vectorized image.
-            patch_end_seed = min(
-                top_left_seed + delta_width * delta_height,
-                self.n_features
+            # the seed indexes the (delta_height, delta_width) grid of top-left
+            # positions, which is mapped to the top-left point in the data
+            top_left_point = (
+                (top_left_seed // delta_width) * data_width + top_left_seed % delta_width
             )
 
-            for feat_i in range(top_left_seed, patch_end_seed):
-                # now compute top-left point
-                vectorized_point = (feat_i % delta_width) + \
-                                    (data_width * <SIZE_t>floor(feat_i / delta_width))
-
-                # store the non-zero indices and non-zero weights of the data
-                proj_mat_indices[proj_i].push_back(vectorized_point)
-                proj_mat_weights[proj_i].push_back(weight)
+            # store the indices of the patch in row-major order, which are
+            # written directly rather than pushed back one by one, so that the
+            # rows of the patch are filled by vectorized loops
+            proj_mat_weights[proj_i].assign(patch_height * patch_width, weight)
+            proj_mat_indices[proj_i].resize(patch_height * patch_width)
+            patch_indices = proj_mat_indices[proj_i].data()
+            for patch_row in range(patch_height):
+                row_point = top_left_point + patch_row * data_width
+                for patch_col in range(patch_width):
+                    patch_indices[patch_row * patch_width + patch_col] = row_point + patch_col
@@ -20,7 +20,7 @@ from sklearn.tree._tree cimport INT32_t  # Signed 32 bit integer
 from sklearn.tree._tree cimport SIZE_t  # Type for indices and counters
 from sklearn.tree._tree cimport UINT32_t  # Unsigned 32 bit integer
 
-from ._sklearn_splitter cimport sort
+from ._sklearn_splitter cimport radix_sort, sort
 
 
 cdef struct ObliqueSplitRecord:
@@ -49,6 +49,22 @@ cdef class BaseObliqueSplitter(Splitter):
     # TODO: assumes all oblique splitters only work with dense data
     cdef const DTYPE_t[:, :] X
 
+    cdef public int n_threads                           # Number of OpenMP threads to project with
+    cdef int n_node_threads                             # Number of them to project the current node with
+
+    # Buffers to compute all sampled projections of a node at once, used when
+    # ``dense_projection`` is enabled by the splitter. The dense projection matrix
+    # and the block of samples are only used by the BLAS ``project_dense``
+    cdef bint dense_projection                          # Whether to project with dense BLAS products
+    cdef DTYPE_t[:, ::1] proj_mat_dense                 # dense projection matrix (n_features, max_features)
+    cdef DTYPE_t[:, ::1] X_block                        # gathered block of node samples
+    cdef DTYPE_t[::1] proj_values                       # projected node samples of a block of projections
+    cdef SIZE_t[::1] samples_snapshot                   # order of the node samples in proj_values
+
+    # Buffers of the radix sort of the projected node samples
+    cdef UINT32_t[::1] sort_keys_buffer                 # (n_samples,) sorted keys of a pass
+    cdef SIZE_t[::1] sort_samples_buffer                # (n_samples,) sorted samples of a pass
+
     # All oblique splitters (i.e. non-axis aligned splitters) require a
     # function to sample a projection matrix that is applied to the feature matrix
     # to quickly obtain the sampled projections for candidate splits.
@@ -58,6 +74,24 @@ cdef class BaseObliqueSplitter(Splitter):
         vector[vector[SIZE_t]]& proj_mat_indices
     ) nogil 
 
+    cdef int init_dense_projection(self, double n_non_zeros) except -1
+    cdef SIZE_t n_dense_projections(self) noexcept nogil
+    cdef bint dense_projection_pays_off(self) noexcept nogil
+    cdef void project_dense(
+        self,
+        SIZE_t start,
+        SIZE_t end,
+        SIZE_t proj_start,
+        SIZE_t proj_end
+    ) noexcept nogil
+    cdef void project(self, ObliqueSplitRecord* split, int n_threads) noexcept nogil
+    cdef void find_best_split(
+        self,
+        ObliqueSplitRecord* current_split,
+        ObliqueSplitRecord* best_split,
+        double* best_proxy_improvement
+    ) noexcept nogil
+
     # Redefined here since the new logic requires calling sample_proj_mat
     cdef int node_reset(
         self,
@@ -11,9 +11,12 @@ cimport numpy as cnp
 cnp.import_array()
 
 from cython.operator cimport dereference as deref
+from cython.parallel cimport prange
+from libc.string cimport memcpy
 from libcpp.vector cimport vector
 from sklearn.tree._criterion cimport Criterion
 from sklearn.tree._utils cimport rand_int
+from sklearn.utils._cython_blas cimport RowMajor, Trans, _gemm
 
 
 cdef double INFINITY = np.inf
@@ -25,6 +28,24 @@ cdef DTYPE_t FEATURE_THRESHOLD = 1e-7
 # in SparseSplitter
 cdef DTYPE_t EXTRACT_NNZ_SWITCH = 0.1
 
+# Minimum number of samples in a node for its projections to be computed with
+# several threads, below which the cost of a parallel region dominates
+cdef SIZE_t MIN_PARALLEL_SAMPLES = 10000
+
+# The projections are computed with dense BLAS products when the number of
+# non-zeros of the projection matrix times this ratio reaches its size, i.e.
+# when gathering each non-zero costs more than this many multiply-adds
+cdef SIZE_t DENSE_PROJECTION_RATIO = 64
+
+# Minimum number of samples in a node for its projections to be computed with
+# dense BLAS products, and number of samples gathered for each product
+cdef SIZE_t MIN_DENSE_PROJECTION_SAMPLES = 64
+cdef SIZE_t PROJECTION_BLOCK_SIZE = 256
+
+# Maximum number of projections computed at once with dense products, which
+# bounds the memory of their values to this many times the number of samples
+cdef SIZE_t MAX_DENSE_PROJECTIONS = 16
+
 
 cdef inline void _init_split(ObliqueSplitRecord* self, SIZE_t start_pos) noexcept nogil:
     self.impurity_left = INFINITY
@@ -34,6 +55,18 @@ cdef inline void _init_split(ObliqueSplitRecord* self, SIZE_t start_pos) noexcep
     self.threshold = 0.
     self.improvement = -INFINITY
 
+cdef inline void _restore_projection(
+    SIZE_t* samples,
+    DTYPE_t* Xf,
+    const SIZE_t* samples_snapshot,
+    const DTYPE_t* proj_values,
+    SIZE_t n_node_samples
+) noexcept nogil:
+    """Copy a projection computed by ``project_dense`` into the node's samples."""
+    memcpy(samples, samples_snapshot, n_node_samples * sizeof(SIZE_t))
+    memcpy(Xf, proj_values, n_node_samples * sizeof(DTYPE_t))
+
+
 cdef class BaseObliqueSplitter(Splitter):
     """Abstract oblique splitter class.
 
@@ -86,12 +119,34 @@ cdef class BaseObliqueSplitter(Splitter):
         self.proj_mat_weights = vector[vector[DTYPE_t]](self.max_features)
         self.proj_mat_indices = vector[vector[SIZE_t]](self.max_features)
 
+        # Projections are computed serially unless enabled by the tree
+        self.n_threads = 1
+
     def __getstate__(self):
         return {}
 
     def __setstate__(self, d):
         pass
 
+    cdef int init(
+        self,
+        object X,
+        const DOUBLE_t[:, ::1] y,
+        const DOUBLE_t[:] sample_weight
+    ) except -1:
+        Splitter.init(self, X, y, sample_weight)
+
+        # the scratch buffers of the threads are sized for n_threads, which must
+        # not change from here on, whereas a builder may project some nodes with
+        # fewer threads
+        self.n_node_threads = self.n_threads
+
+        # the radix sort scatters into buffers that hold all samples, which are
+        # allocated once rather than for every node
+        self.sort_keys_buffer = np.empty(self.n_samples, dtype=np.uint32)
+        self.sort_samples_buffer = np.empty(self.n_samples, dtype=np.intp)
+        return 0
+
     cdef int node_reset(self, SIZE_t start, SIZE_t end,
                         double* weighted_n_node_samples) except -1 nogil:
         """Reset splitter on node samples[start:end].
@@ -137,6 +192,224 @@ cdef class BaseObliqueSplitter(Splitter):
         """
         pass
 
+    cdef int init_dense_projection(self, double n_non_zeros) except -1:
+        """Enable projecting with dense BLAS products if it pays off.
+
+        Must be called at the end of ``init`` by splitters whose projection
+        matrices are expected to have ``n_non_zeros`` non-zeros, with which
+        the density required by ``DENSE_PROJECTION_RATIO`` is checked.
+
+        Returns -1 in case of failure to allocate memory (and raise MemoryError)
+        or 0 otherwise.
+        """
+        self.dense_projection = (
+            n_non_zeros * DENSE_PROJECTION_RATIO >= self.n_features * self.max_features
+        )
+        if self.dense_projection:
+            self.proj_mat_dense = np.zeros((self.n_features, self.max_features), dtype=np.float32)
+            self.X_block = np.empty((PROJECTION_BLOCK_SIZE, self.n_features), dtype=np.float32)
+            self.proj_values = np.empty(
+                self.n_dense_projections() * self.n_samples, dtype=np.float32
+            )
+            self.samples_snapshot = np.empty(self.n_samples, dtype=np.intp)
+        return 0
+
+    cdef SIZE_t n_dense_projections(self) noexcept nogil:
+        """The number of projections computed at once by ``project_dense``."""
+        return min(self.max_features, MAX_DENSE_PROJECTIONS)
+
+    cdef bint dense_projection_pays_off(self) noexcept nogil:
+        """Whether to compute the sampled projections with ``project_dense``.
+
+        The number of non-zeros of some projection matrices varies between
+        nodes, so the density required by ``DENSE_PROJECTION_RATIO`` is checked
+        again for the projection matrix sampled for the current node.
+        """
+        cdef SIZE_t n_non_zeros = 0
+        cdef SIZE_t i
+
+        for i in range(self.max_features):
+            n_non_zeros += self.proj_mat_indices[i].size()
+        return n_non_zeros * DENSE_PROJECTION_RATIO >= self.n_features * self.max_features
+
+    cdef void project_dense(
+        self,
+        SIZE_t start,
+        SIZE_t end,
+        SIZE_t proj_start,
+        SIZE_t proj_end
+    ) noexcept nogil:
+        """Compute the sampled projections proj_start to proj_end of samples[start:end].
+
+        The sampled projection vectors are scattered into a dense projection
+        matrix, and blocks of the node's samples are gathered and multiplied
+        with it using BLAS. The value of the ``j``-th node sample for the
+        projection ``i`` is stored in
+        ``proj_values[(i - proj_start) * (end - start) + j]``, where the node
+        samples are in the order of ``samples_snapshot``.
+        """
+        cdef SIZE_t[::1] samples = self.samples
+        cdef const DTYPE_t[:, :] X = self.X
+        cdef DTYPE_t[:, ::1] proj_mat = self.proj_mat_dense
+        cdef DTYPE_t[:, ::1] X_block = self.X_block
+        cdef SIZE_t max_features = self.max_features
+        cdef SIZE_t n_features = self.n_features
+        cdef SIZE_t n_node_samples = end - start
+        cdef SIZE_t i, j, block_start, block_size
+
+        for i in range(proj_start, proj_end):
+            for j in range(self.proj_mat_indices[i].size()):
+                proj_mat[self.proj_mat_indices[i][j], i] += self.proj_mat_weights[i][j]
+
+        memcpy(&self.samples_snapshot[0], &samples[start], n_node_samples * sizeof(SIZE_t))
+
+        block_start = start
+        while block_start < end:
+            block_size = min(PROJECTION_BLOCK_SIZE, end - block_start)
+            for i in range(block_size):
+                for j in range(n_features):
+                    X_block[i, j] = X[samples[block_start + i], j]
+
+            # proj_values[:, block] = proj_mat[:, proj_start:proj_end].T @ X_block.T
+            _gemm(RowMajor, Trans, Trans, proj_end - proj_start, block_size, n_features, 1.0,
+                  &proj_mat[0, proj_start], max_features, &X_block[0, 0], n_features, 0.0,
+                  &self.proj_values[block_start - start], n_node_samples)
+            block_start += block_size
+
+        # clear the projection matrix for the next projections
+        for i in range(proj_start, proj_end):
+            for j in range(self.proj_mat_indices[i].size()):
+                proj_mat[self.proj_mat_indices[i][j], i] = 0
+
+    cdef void project(self, ObliqueSplitRecord* split, int n_threads) noexcept nogil:
+        """Project samples[start:end] with the projection vector of ``split``.
+
+        The projection is stored in ``feature_values``, summed in the order in
+        which ``ObliqueTree`` projects the samples it is applied to.
+        """
+        cdef SIZE_t[::1] samples = self.samples
+        cdef SIZE_t start = self.start
+        cdef SIZE_t end = self.end
+        cdef DTYPE_t[::1] Xf = self.feature_values
+        cdef const DTYPE_t[:, :] X = self.X
+        cdef const SIZE_t* proj_indices = split.proj_vec_indices.data()
+        cdef const DTYPE_t* proj_weights = split.proj_vec_weights.data()
+        cdef SIZE_t n_proj_nonzeros = split.proj_vec_indices.size()
+        cdef SIZE_t idx, jdx
+        cdef SIZE_t feature, feature_1
+        cdef DTYPE_t weight, weight_1
+        cdef DTYPE_t temp_d         # to compute a projection feature value
+
+        # the rows of a Fortran-ordered X are scattered, so its non-zeros are
+        # gathered for all samples one column at a time rather than per sample
+        cdef bint gather_columns = X.strides[0] == sizeof(DTYPE_t)
+
+        # Compute linear combination of features and then
+        # sort samples according to the feature values.
+        if gather_columns:
+            # gather one column of X at a time, which streams through
+            # Xf and the samples and vectorizes, with the same sums
+            feature = proj_indices[0]
+            weight = proj_weights[0]
+            for idx in prange(start, end, schedule='static', num_threads=n_threads):
+                Xf[idx] = X[samples[idx], feature] * weight
+            for jdx in range(1, n_proj_nonzeros):
+                feature = proj_indices[jdx]
+                weight = proj_weights[jdx]
+                for idx in prange(start, end, schedule='static', num_threads=n_threads):
+                    Xf[idx] += X[samples[idx], feature] * weight
+        elif n_proj_nonzeros == 1:
+            # most projection vectors have one or two non-zeros, whose
+            # sums are unrolled so that each sample is a single
+            # expression, with the same float32 results as the loop below
+            feature = proj_indices[0]
+            weight = proj_weights[0]
+            for idx in prange(start, end, schedule='static', num_threads=n_threads):
+                Xf[idx] = X[samples[idx], feature] * weight
+        elif n_proj_nonzeros == 2:
+            feature = proj_indices[0]
+            weight = proj_weights[0]
+            feature_1 = proj_indices[1]
+            weight_1 = proj_weights[1]
+            for idx in prange(start, end, schedule='static', num_threads=n_threads):
+                Xf[idx] = (
+                    X[samples[idx], feature] * weight
+                    + X[samples[idx], feature_1] * weight_1
+                )
+        else:
+            for idx in prange(start, end, schedule='static', num_threads=n_threads):
+                # accumulate in a register rather than in Xf, which the
+                # compiler cannot assume is not aliased by X, in the same
+                # float32 precision. An in-place ``+=`` would make temp_d a
+                # reduction variable of the prange
+                temp_d = 0
+                for jdx in range(0, n_proj_nonzeros):
+                    temp_d = temp_d + X[samples[idx], proj_indices[jdx]] * proj_weights[jdx]
+                Xf[idx] = temp_d
+
+    cdef void find_best_split(
+        self,
+        ObliqueSplitRecord* current_split,
+        ObliqueSplitRecord* best_split,
+        double* best_proxy_improvement
+    ) noexcept nogil:
+        """Sort the projected samples[start:end] and evaluate all their splits.
+
+        ``best_split`` and ``best_proxy_improvement`` are updated if a split of
+        the projection of ``current_split`` improves on them.
+        """
+        cdef SIZE_t start = self.start
+        cdef SIZE_t end = self.end
+        cdef DTYPE_t[::1] Xf = self.feature_values
+        cdef SIZE_t min_samples_leaf = self.min_samples_leaf
+        cdef double min_weight_leaf = self.min_weight_leaf
+        cdef double current_proxy_improvement
+        cdef SIZE_t p
+
+        # Sort the samples
+        radix_sort(&Xf[start], &self.samples[start], &self.sort_keys_buffer[0],
+                   &self.sort_samples_buffer[0], end - start)
+
+        # Evaluate all splits
+        self.criterion.reset()
+        p = start
+        while p < end:
+            while (p + 1 < end and Xf[p + 1] <= Xf[p] + FEATURE_THRESHOLD):
+                p += 1
+
+            p += 1
+
+            if p < end:
+                current_split.pos = p
+
+                # Reject if min_samples_leaf is not guaranteed
+                if (((current_split.pos - start) < min_samples_leaf) or
+                        ((end - current_split.pos) < min_samples_leaf)):
+                    continue
+
+                self.criterion.update(current_split.pos)
+                # Reject if min_weight_leaf is not satisfied
+                if ((self.criterion.weighted_n_left < min_weight_leaf) or
+                        (self.criterion.weighted_n_right < min_weight_leaf)):
+                    continue
+
+                current_proxy_improvement = \
+                    self.criterion.proxy_impurity_improvement()
+
+                if current_proxy_improvement > best_proxy_improvement[0]:
+                    best_proxy_improvement[0] = current_proxy_improvement
+                    # sum of halves is used to avoid infinite value
+                    current_split.threshold = Xf[p - 1] / 2.0 + Xf[p] / 2.0
+
+                    if (
+                        (current_split.threshold == Xf[p]) or
+                        (current_split.threshold == INFINITY) or
+                        (current_split.threshold == -INFINITY)
+                    ):
+                        current_split.threshold = Xf[p - 1]
+
+                    best_split[0] = current_split[0]  # copy
+
     cdef int pointer_size(self) noexcept nogil:
         """Get size of a pointer to record for ObliqueSplitter."""
 
@@ -164,28 +437,46 @@ cdef class BaseObliqueSplitter(Splitter):
         # pointer array to store feature values to split on
         cdef DTYPE_t[::1]  Xf = self.feature_values
         cdef SIZE_t max_features = self.max_features
-        cdef SIZE_t min_samples_leaf = self.min_samples_leaf
-        cdef double min_weight_leaf = self.min_weight_leaf
 
         # keep track of split record for current_split node and the best_split split
         # found among the sampled projection vectors
         cdef ObliqueSplitRecord best_split, current_split
-        cdef double current_proxy_improvement = -INFINITY
         cdef double best_proxy_improvement = -INFINITY
 
         cdef SIZE_t feat_i, p       # index over computed features and start/end
-        cdef SIZE_t idx, jdx        # index over max_feature, and
         cdef SIZE_t partition_end
-        cdef DTYPE_t temp_d         # to compute a projection feature value
+
+        # the scan over each projection updates the criterion in place, so only
+        # the projection of the samples, which is independent for each sample,
+        # is split over the threads, and only in nodes large enough to pay off
+        cdef int n_threads = self.n_node_threads if end - start >= MIN_PARALLEL_SAMPLES else 1
+
+        cdef bint dense_projection = (
+            self.dense_projection and end - start >= MIN_DENSE_PROJECTION_SAMPLES
+        )
+        cdef SIZE_t n_dense_projections = self.n_dense_projections()
+        cdef SIZE_t proj_start = 0
+        cdef DTYPE_t[::1] proj_values = self.proj_values
+        cdef SIZE_t[::1] samples_snapshot = self.samples_snapshot
 
         # instantiate the split records
         _init_split(&best_split, end)
 
         # Sample the projection matrix
         self.sample_proj_mat(self.proj_mat_weights, self.proj_mat_indices)
+        if dense_projection:
+            dense_projection = self.dense_projection_pays_off()
 
         # For every vector in the projection matrix
         for feat_i in range(max_features):
+            if dense_projection and feat_i % n_dense_projections == 0:
+                # the projections are computed a block at a time, which bounds
+                # the memory of their values
+                proj_start = feat_i
+                self.project_dense(
+                    start, end, proj_start, min(proj_start + n_dense_projections, max_features)
+                )
+
             # Projection vector has no nonzeros
             if self.proj_mat_weights[feat_i].empty():
                 continue
@@ -196,78 +487,48 @@ cdef class BaseObliqueSplitter(Splitter):
             current_split.proj_vec_weights = &self.proj_mat_weights[feat_i]
             current_split.proj_vec_indices = &self.proj_mat_indices[feat_i]
 
-            # Compute linear combination of features and then
-            # sort samples according to the feature values.
-            for idx in range(start, end):
-                # initialize the feature value to 0
-                Xf[idx] = 0
-                for jdx in range(0, current_split.proj_vec_indices.size()):
-                    Xf[idx] += self.X[
-                        samples[idx], deref(current_split.proj_vec_indices)[jdx]
-                    ] * deref(current_split.proj_vec_weights)[jdx]
-
-            # Sort the samples
-            sort(&Xf[start], &samples[start], end - start)
-
-            # Evaluate all splits
-            self.criterion.reset()
-            p = start
-            while p < end:
-                while (p + 1 < end and Xf[p + 1] <= Xf[p] + FEATURE_THRESHOLD):
-                    p += 1
-
-                p += 1
-
-                if p < end:
-                    current_split.pos = p
-
-                    # Reject if min_samples_leaf is not guaranteed
-                    if (((current_split.pos - start) < min_samples_leaf) or
-                            ((end - current_split.pos) < min_samples_leaf)):
-                        continue
-
-                    self.criterion.update(current_split.pos)
-                    # Reject if min_weight_leaf is not satisfied
-                    if ((self.criterion.weighted_n_left < min_weight_leaf) or
-                            (self.criterion.weighted_n_right < min_weight_leaf)):
-                        continue
-
-                    current_proxy_improvement = \
-                        self.criterion.proxy_impurity_improvement()
-
-                    if current_proxy_improvement > best_proxy_improvement:
-                        best_proxy_improvement = current_proxy_improvement
-                        # sum of halves is used to avoid infinite value
-                        current_split.threshold = Xf[p - 1] / 2.0 + Xf[p] / 2.0
-
-                        if (
-                            (current_split.threshold == Xf[p]) or
-                            (current_split.threshold == INFINITY) or
-                            (current_split.threshold == -INFINITY)
-                        ):
-                            current_split.threshold = Xf[p - 1]
-
-                        best_split = current_split  # copy
+            if dense_projection:
+                # restore the order the samples were projected in, which the
+                # previous projection has sorted
+                _restore_projection(
+                    &samples[start], &Xf[start], &samples_snapshot[0],
+                    &proj_values[(feat_i - proj_start) * (end - start)], end - start
+                )
+            else:
+                self.project(&current_split, n_threads)
+
+            self.find_best_split(&current_split, &best_split, &best_proxy_improvement)
+
+        if dense_projection and best_split.pos < end:
+            # the dense products sum the projections in another order than the
+            # tree applies them in, which may round a sample next to the
+            # threshold to the other side of it, so the split of the best
+            # projection is found again on its values summed in that order
+            current_split = best_split
+            _init_split(&best_split, end)
+            best_proxy_improvement = -INFINITY
+            self.project(&current_split, n_threads)
+            self.find_best_split(&current_split, &best_split, &best_proxy_improvement)
 
         # Reorganize into samples[start:best_split.pos] + samples[best_split.pos:end]
         if best_split.pos < end:
             partition_end = end
             p = start
 
-            while p < partition_end:
-                # Account for projection vector
-                temp_d = 0.0
-                for j in range(best_split.proj_vec_indices.size()):
-                    temp_d += self.X[samples[p], deref(best_split.proj_vec_indices)[j]] *\
-                                deref(best_split.proj_vec_weights)[j]
+            # the best projection is the last one that was sorted, or the last
+            # one projected and sorted again, so Xf holds its values
+            if best_split.feature != current_split.feature:
+                self.project(&best_split, n_threads)
 
-                if temp_d <= best_split.threshold:
+            while p < partition_end:
+                if Xf[p] <= best_split.threshold:
                     p += 1
 
                 else:
                     partition_end -= 1
                     samples[p], samples[partition_end] = \
                         samples[partition_end], samples[p]
+                    Xf[p], Xf[partition_end] = Xf[partition_end], Xf[p]
 
             self.criterion.reset()
             self.criterion.update(best_split.pos)
@@ -330,7 +591,7 @@ cdef class ObliqueSplitter(BaseObliqueSplitter):
         self.feature_combinations = feature_combinations
 
         # or max w/ 1...
-        self.n_non_zeros = max(int(self.max_features * self.feature_combinations), 1)
+        self.n_non_zeros = max(<SIZE_t>(self.max_features * self.feature_combinations), 1)
 
     def __getstate__(self):
         return {}
@@ -344,13 +605,19 @@ cdef class ObliqueSplitter(BaseObliqueSplitter):
         const DOUBLE_t[:, ::1] y,
         const DOUBLE_t[:] sample_weight
     ) except -1:
-        Splitter.init(self, X, y, sample_weight)
-
-        self.X = X
+        BaseObliqueSplitter.init(self, X, y, sample_weight)
 
         # create a helper array for allowing efficient Fisher-Yates
         self.indices_to_sample = np.arange(self.max_features * self.n_features,
                                            dtype=np.intp)
+
+        # project with dense BLAS products if the projection matrix is dense enough
+        self.init_dense_projection(self.n_non_zeros)
+
+        # X is used in the layout it is given: sparse projections gather their
+        # non-zeros one feature at a time, down the columns of a Fortran-ordered
+        # X, and otherwise one sample at a time, along the rows
+        self.X = X
         return 0
 
 
@@ -404,9 +671,11 @@ cdef class BestObliqueSplitter(ObliqueSplitter):
         cdef SIZE_t[::1] indices_to_sample = self.indices_to_sample
         cdef SIZE_t grid_size = self.max_features * self.n_features
 
-        # shuffle indices over the 2D grid to sample using Fisher-Yates
-        for i in range(0, grid_size):
-            j = rand_int(0, grid_size - i, random_state)
+        # shuffle the first 'n_non_zeros' indices over the 2D grid using
+        # Fisher-Yates, which is all that is sampled from it, so that the cost
+        # of a node does not grow with the size of the grid
+        for i in range(0, n_non_zeros):
+            j = rand_int(i, grid_size, random_state)
             indices_to_sample[j], indices_to_sample[i] = \
                 indices_to_sample[i], indices_to_sample[j]
 
@@ -425,3 +694,16 @@ cdef class BestObliqueSplitter(ObliqueSplitter):
 
             proj_mat_indices[proj_i].push_back(feat_i)  # Store index of nonzero
             proj_mat_weights[proj_i].push_back(weight)  # Store weight of nonzero
+
+        # reset the grid to the identity, so that the projections of a node only
+        # depend on its random state and not on the nodes sampled before it by
+        # this splitter, which differ when the nodes of a level are split by
+        # several threads. Only the first 'n_non_zeros' entries and the entries
+        # swapped with them were moved, and the index of each entry past
+        # 'n_non_zeros' that was moved is now among the first 'n_non_zeros'
+        for i in range(0, n_non_zeros):
+            rand_vec_index = indices_to_sample[i]
+            if rand_vec_index >= n_non_zeros:
+                indices_to_sample[rand_vec_index] = rand_vec_index
+        for i in range(0, n_non_zeros):
+            indices_to_sample[i] = i
@@ -20,12 +20,42 @@ from sklearn.tree._tree cimport SIZE_t  # Type for indices and counters
 from sklearn.tree._tree cimport UINT32_t  # Unsigned 32 bit integer
 from sklearn.tree._tree cimport Node, Tree, TreeBuilder
 
-from ._oblique_splitter cimport ObliqueSplitRecord
+from ._oblique_splitter cimport BaseObliqueSplitter, ObliqueSplitRecord
+
+
+cdef struct PackedNode:
+    # The data of a split node needed to apply the tree, packed for inference.
+    # Only the split nodes are packed, in pre-order. A child that is a leaf is
+    # referred to by -(id of the leaf) - 1, and a split node by its position.
+    SIZE_t left_child                    # left child of the node
+    SIZE_t right_child                   # right child of the node
+    double threshold                     # Threshold value at the node
+    SIZE_t proj_start                    # the projection vector of the node is packed_nonzeros
+                                         # [proj_start:proj_start of the next packed node]
+
+
+cdef struct PackedNonzero:
+    # A non-zero of a projection vector, packed for inference
+    SIZE_t feature                       # index of the feature
+    DTYPE_t weight                       # weight of the feature
 
 
 cdef class ObliqueTree(Tree):
-    cdef vector[vector[DTYPE_t]] proj_vec_weights # (capacity, n_features) array of projection vectors
-    cdef vector[vector[SIZE_t]] proj_vec_indices  # (capacity, n_features) array of projection vectors
+    # the projection vectors of the split nodes are stored one after the other
+    # in the order the nodes are added, rather than in a vector per node, where
+    # the vector of node i is proj_vec_weights[proj_vec_start[i]:proj_vec_end[i]]
+    cdef vector[DTYPE_t] proj_vec_weights         # weights of the non-zeros of all projection vectors
+    cdef vector[SIZE_t] proj_vec_indices          # features of the non-zeros of all projection vectors
+    cdef vector[SIZE_t] proj_vec_start            # (capacity,) start of the projection vector of each node
+    cdef vector[SIZE_t] proj_vec_end              # (capacity,) end of the projection vector of each node
+
+    # contiguous copies of the split nodes and their projection vectors for
+    # inference, which are built on first use and cleared whenever the nodes are
+    # resized. The packed nodes end with a sentinel, which ends the last vector.
+    cdef vector[PackedNode] packed_nodes          # (n_split_nodes + 1,) array of packed nodes
+    cdef vector[PackedNonzero] packed_nonzeros    # non-zeros of the projection vectors
+
+    cdef int _pack_nodes(self) except -1
 
     # overridden methods
     cdef int _resize_c(
@@ -49,4 +79,63 @@ cdef class ObliqueTree(Tree):
         Node* node
     ) noexcept nogil
 
+    cpdef cnp.ndarray apply(self, object X)
     cpdef cnp.ndarray get_projection_matrix(self)
+
+
+# =============================================================================
+# Tree builder
+# =============================================================================
+
+cdef struct LevelRecord:
+    # Record of a node of the level of the tree that is being split
+    SIZE_t start
+    SIZE_t end
+    SIZE_t depth
+    SIZE_t parent
+    bint is_left
+    bint is_leaf
+    double impurity
+    double weighted_n_node_samples
+    SIZE_t n_constant_features
+    UINT32_t rand_r_state                # random state of the splitter for the node
+
+
+cdef class ParallelTreeBuilder:
+    # The ParallelTreeBuilder builds an ObliqueTree level by level, where the
+    # nodes of each level are split concurrently by threads that each have their
+    # own splitter, and then added to the tree in order.
+
+    cdef list splitters                  # Splitting algorithm of each thread
+
+    cdef SIZE_t min_samples_split        # Minimum number of samples in an internal node
+    cdef SIZE_t min_samples_leaf         # Minimum number of samples in a leaf
+    cdef double min_weight_leaf          # Minimum weight in a leaf
+    cdef SIZE_t max_depth                # Maximal tree depth
+    cdef double min_impurity_decrease    # Impurity threshold for early stopping
+
+    # The nodes of the level being split and their splits, which own copies of
+    # their projection vectors since the splitters reuse theirs for every node
+    cdef vector[LevelRecord] level
+    cdef vector[ObliqueSplitRecord] level_splits
+    cdef vector[vector[DTYPE_t]] level_proj_weights
+    cdef vector[vector[SIZE_t]] level_proj_indices
+    cdef vector[double] level_values     # (n_level_nodes * value_stride) values of the nodes
+    cdef SIZE_t value_stride             # Stride of the values of a node
+    cdef SIZE_t next_node                # Next node of the level to split
+    cdef UINT32_t rand_r_state           # Draws the random state of each node
+
+    cpdef build(
+        self,
+        ObliqueTree tree,
+        object X,
+        const DOUBLE_t[:, ::1] y,
+        const DOUBLE_t[:] sample_weight=*
+    )
+    cdef _check_input(
+        self,
+        object X,
+        const DOUBLE_t[:, ::1] y,
+        const DOUBLE_t[:] sample_weight
+    )
+    cdef int _split_nodes(self, BaseObliqueSplitter splitter) except -1 nogil
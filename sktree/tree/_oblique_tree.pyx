@@ -17,10 +17,13 @@ cimport numpy as cnp
 
 cnp.import_array()
 
+from numpy import float64 as DOUBLE
 from scipy.sparse import csr_matrix, issparse
+from sklearn.tree._tree import DTYPE, TREE_LEAF, TREE_UNDEFINED
+from sklearn.utils.parallel import Parallel, delayed
 
 from cython.operator cimport dereference as deref
-from sklearn.tree._utils cimport safe_realloc, sizet_ptr_to_ndarray
+from sklearn.tree._utils cimport RAND_R_MAX, rand_int, safe_realloc, sizet_ptr_to_ndarray
 
 
 # Gets Node dtype exposed inside oblique_tree.
@@ -31,6 +34,12 @@ NODE_DTYPE = np.asarray(<Node[:1]>(&dummy)).dtype
 # Mitigate precision differences between 32 bit and 64 bit
 cdef DTYPE_t FEATURE_THRESHOLD = 1e-7
 
+cdef double INFINITY = np.inf
+cdef double EPSILON = np.finfo('double').eps
+
+cdef SIZE_t _TREE_LEAF = TREE_LEAF
+cdef SIZE_t _TREE_UNDEFINED = TREE_UNDEFINED
+
 # =============================================================================
 # ObliqueTree
 # =============================================================================
@@ -116,9 +125,6 @@ cdef class ObliqueTree(Tree):
         self.value = NULL
         self.nodes = NULL
 
-        self.proj_vec_weights = vector[vector[DTYPE_t]](self.capacity)
-        self.proj_vec_indices = vector[vector[SIZE_t]](self.capacity)
-
     def __reduce__(self):
         """Reduce re-implementation, for pickling."""
         return (ObliqueTree, (
@@ -168,26 +174,151 @@ cdef class ObliqueTree(Tree):
         # now set the projection vector weights and indices
         proj_vecs = d['proj_vecs']
         self.n_features = proj_vecs.shape[1]
+        self.proj_vec_weights.clear()
+        self.proj_vec_indices.clear()
         for i in range(0, self.node_count):
+            self.proj_vec_start[i] = self.proj_vec_weights.size()
             for j in range(0, self.n_features):
                 weight = proj_vecs[i, j]
                 if weight == 0:
                     continue
-                self.proj_vec_weights[i].push_back(weight)
-                self.proj_vec_indices[i].push_back(j)
+                self.proj_vec_weights.push_back(weight)
+                self.proj_vec_indices.push_back(j)
+            self.proj_vec_end[i] = self.proj_vec_weights.size()
 
         nodes = memcpy(self.nodes, cnp.PyArray_DATA(node_ndarray),
                        self.capacity * sizeof(Node))
         value = memcpy(self.value, cnp.PyArray_DATA(value_ndarray),
                        self.capacity * self.value_stride * sizeof(double))
 
+    cdef int _pack_nodes(self) except -1:
+        """Pack the split nodes and their projection vectors for inference.
+
+        Applying the tree only needs the children, threshold and projection
+        vector of each node it passes through. These are copied into a compact
+        array of nodes and a single array of the projection non-zeros, so that
+        each node costs a couple of cache lines rather than a ``Node`` struct
+        and the separately stored weights and indices of its projection vector.
+
+        A leaf has neither a projection vector nor a threshold, and all that
+        applying the tree needs from it is its id. As in the DF- layout of
+        decision forests, leaves are therefore not packed, and a child that is
+        a leaf is referred to by its id, encoded as ``-(leaf id) - 1``. A binary
+        tree has one leaf more than it has split nodes, so this halves the
+        packed nodes and the working set of the traversal.
+
+        The split nodes are packed in depth-first pre-order, in which every
+        subtree is contiguous and a node is followed by its left child if that
+        is a split node. The builders add the nodes level by level or in the
+        order they are expanded instead. The projection vectors are packed in the same order, so that
+        a vector ends where the one of the next packed node starts, and only
+        its start needs to be stored, which fits two packed nodes per cache
+        line.
+        """
+        cdef SIZE_t i, j, k
+        cdef Node* node
+        cdef PackedNode packed
+        cdef PackedNonzero nonzero
+        cdef vector[SIZE_t] stack
+        cdef vector[SIZE_t] split_node_ids
+        cdef vector[SIZE_t] packed_index
+
+        # find the pre-order of the split nodes and the position of each in it,
+        # or the encoded id of each leaf
+        packed_index.resize(self.node_count)
+        if self.node_count > 0:
+            stack.push_back(0)
+        while not stack.empty():
+            i = stack.back()
+            stack.pop_back()
+            if self.nodes[i].left_child == _TREE_LEAF:
+                packed_index[i] = -i - 1
+                continue
+            packed_index[i] = split_node_ids.size()
+            split_node_ids.push_back(i)
+            stack.push_back(self.nodes[i].right_child)
+            stack.push_back(self.nodes[i].left_child)
+
+        self.packed_nodes.clear()
+        self.packed_nonzeros.clear()
+        self.packed_nodes.reserve(split_node_ids.size() + 1)
+        for k in range(split_node_ids.size()):
+            i = split_node_ids[k]
+            node = &self.nodes[i]
+            packed.left_child = packed_index[node.left_child]
+            packed.right_child = packed_index[node.right_child]
+            packed.threshold = node.threshold
+            packed.proj_start = self.packed_nonzeros.size()
+            for j in range(self.proj_vec_start[i], self.proj_vec_end[i]):
+                nonzero.feature = self.proj_vec_indices[j]
+                nonzero.weight = self.proj_vec_weights[j]
+                self.packed_nonzeros.push_back(nonzero)
+            self.packed_nodes.push_back(packed)
+
+        # the sentinel ends the projection vector of the last packed node
+        packed.left_child = _TREE_LEAF
+        packed.right_child = _TREE_LEAF
+        packed.threshold = 0.0
+        packed.proj_start = self.packed_nonzeros.size()
+        self.packed_nodes.push_back(packed)
+        return 0
+
+    cpdef cnp.ndarray apply(self, object X):
+        """Finds the terminal region (=leaf node) for each sample in X.
+
+        Dense input is applied using the packed nodes, which gives the same
+        projections as ``_compute_feature``.
+        """
+        if issparse(X):
+            return Tree.apply(self, X)
+
+        if not isinstance(X, np.ndarray):
+            raise ValueError("X should be in np.ndarray format, got %s" % type(X))
+        if X.dtype != DTYPE:
+            raise ValueError("X.dtype should be np.float32, got %s" % X.dtype)
+
+        if self.packed_nodes.empty():
+            self._pack_nodes()
+
+        cdef const DTYPE_t[:, :] X_ndarray = X
+        cdef SIZE_t n_samples = X.shape[0]
+        cdef SIZE_t[::1] out = np.zeros(n_samples, dtype=np.intp)
+        cdef const PackedNode* nodes = self.packed_nodes.data()
+        cdef const PackedNonzero* nonzeros = self.packed_nonzeros.data()
+        # a tree whose root is a leaf has only the sentinel packed
+        cdef SIZE_t root = 0 if self.packed_nodes.size() > 1 else -1
+        cdef DTYPE_t proj_feat
+        cdef SIZE_t i, j, k
+
+        with nogil:
+            for i in range(n_samples):
+                k = root
+                # While node not a leaf
+                while k >= 0:
+                    proj_feat = 0.0
+                    for j in range(nodes[k].proj_start, nodes[k + 1].proj_start):
+                        proj_feat += X_ndarray[i, nonzeros[j].feature] * nonzeros[j].weight
+
+                    # Written so that compilers emit a branch rather than the
+                    # conditional move they pick for ``proj_feat <= threshold``:
+                    # a predicted branch lets the next node be fetched before
+                    # the projection is known, which is faster despite the
+                    # mispredictions. As before, NaN values go to the right.
+                    if proj_feat > nodes[k].threshold or proj_feat != proj_feat:
+                        k = nodes[k].right_child
+                    else:
+                        k = nodes[k].left_child
+                out[i] = -k - 1
+
+        return np.asarray(out)
+
     cpdef cnp.ndarray get_projection_matrix(self):
         """Get the projection matrix of shape (node_count, n_features)."""
         proj_vecs = np.zeros((self.node_count, self.n_features), dtype=np.float64)
         for i in range(0, self.node_count):
-            for j in range(0, self.proj_vec_weights[i].size()):
-                weight = self.proj_vec_weights[i][j]
-                feat = self.proj_vec_indices[i][j]
+            for j in range(self.proj_vec_start[i], self.proj_vec_end[i]):
+                weight = self.proj_vec_weights[j]
+                feat = self.proj_vec_indices[j]
                 proj_vecs[i, feat] = weight
         return proj_vecs
 
@@ -211,11 +342,10 @@ cdef class ObliqueTree(Tree):
         safe_realloc(&self.nodes, capacity)
         safe_realloc(&self.value, capacity * self.value_stride)
 
-        # only thing added for oblique trees
-        # TODO: this could possibly be removed if we can add projection
-        # indices and weights to Node
-        self.proj_vec_weights.resize(capacity)
-        self.proj_vec_indices.resize(capacity)
+        # only thing added for oblique trees, where the new nodes have empty
+        # projection vectors until they are split
+        self.proj_vec_start.resize(capacity)
+        self.proj_vec_end.resize(capacity)
 
         # value memory is initialised to 0 to enable classifier argmax
         if capacity > self.capacity:
@@ -226,6 +356,10 @@ cdef class ObliqueTree(Tree):
         if capacity < self.node_count:
             self.node_count = capacity
 
+        # the packed nodes are rebuilt on the next call to apply
+        self.packed_nodes.clear()
+        self.packed_nonzeros.clear()
+
         self.capacity = capacity
         return 0
 
@@ -242,13 +376,17 @@ cdef class ObliqueTree(Tree):
         node.threshold = deref(oblique_split_node).threshold
 
         # oblique trees store the projection indices and weights
-        # inside the tree itself
-        self.proj_vec_weights[node_id] = deref(
-            deref(oblique_split_node).proj_vec_weights
-        )
-        self.proj_vec_indices[node_id] = deref(
-            deref(oblique_split_node).proj_vec_indices
-        )
+        # inside the tree itself, appended to those of the previous nodes so
+        # that adding a node does not allocate a vector of its own
+        cdef vector[DTYPE_t]* proj_vec_weights = deref(oblique_split_node).proj_vec_weights
+        cdef vector[SIZE_t]* proj_vec_indices = deref(oblique_split_node).proj_vec_indices
+        cdef SIZE_t j
+
+        self.proj_vec_start[node_id] = self.proj_vec_weights.size()
+        for j in range(proj_vec_weights.size()):
+            self.proj_vec_weights.push_back(deref(proj_vec_weights)[j])
+            self.proj_vec_indices.push_back(deref(proj_vec_indices)[j])
+        self.proj_vec_end[node_id] = self.proj_vec_weights.size()
         return 1
 
     cdef DTYPE_t _compute_feature(
@@ -270,13 +408,10 @@ cdef class ObliqueTree(Tree):
         # get the index of the node
         cdef SIZE_t node_id = node - self.nodes
 
-        # cdef SIZE_t n_projections = proj_vec_indices.size()
         # compute projection of the data based on trained tree
-        # proj_vec_weights = self.proj_vec_weights[node_id]
-        # proj_vec_indices = self.proj_vec_indices[node_id]
-        for j in range(0, self.proj_vec_indices[node_id].size()):
-            feature_index = self.proj_vec_indices[node_id][j]
-            weight = self.proj_vec_weights[node_id][j]
+        for j in range(self.proj_vec_start[node_id], self.proj_vec_end[node_id]):
+            feature_index = self.proj_vec_indices[j]
+            weight = self.proj_vec_weights[j]
 
             # skip a multiplication step if there is nothing to be done
             if weight == 0.0:
@@ -307,9 +442,9 @@ cdef class ObliqueTree(Tree):
 
         cdef int i, feature_index
         cdef DTYPE_t weight
-        for i in range(0, self.proj_vec_indices[node_id].size()):
-            feature_index = self.proj_vec_indices[node_id][i]
-            weight = self.proj_vec_weights[node_id][i]
+        for i in range(self.proj_vec_start[node_id], self.proj_vec_end[node_id]):
+            feature_index = self.proj_vec_indices[i]
+            weight = self.proj_vec_weights[i]
             if weight < 0:
                 weight *= -1
 
@@ -317,3 +452,281 @@ cdef class ObliqueTree(Tree):
                 node.weighted_n_node_samples * node.impurity -
                 left.weighted_n_node_samples * left.impurity -
                 right.weighted_n_node_samples * right.impurity)
+
+
+# =============================================================================
+# Tree builder
+# =============================================================================
+
+cdef class ParallelTreeBuilder:
+    """Build an oblique decision tree level by level, in parallel.
+
+    The nodes of each level are split concurrently by threads that each own a
+    splitter, and then added to the tree in order. The splitters share the
+    samples array, in which the samples of different nodes are disjoint.
+
+    Since the nodes of a level are split in any order, the random state of the
+    splitter is set for each node from a random state that is only drawn from
+    as the nodes are added to the tree. Hence the tree does not depend on the
+    number of threads, including a single one, but differs from the tree grown
+    depth-first by ``DepthFirstTreeBuilder``.
+
+    Parameters
+    ----------
+    splitters : list of BaseObliqueSplitter
+        The splitter of each thread, which must not share their criterion.
+    min_samples_split : SIZE_t
+        The minimum number of samples required to split an internal node.
+    min_samples_leaf : SIZE_t
+        The minimum number of samples required to be at a leaf node.
+    min_weight_leaf : double
+        The minimum weight required to be at a leaf node.
+    max_depth : SIZE_t
+        The maximum depth of the tree.
+    min_impurity_decrease : double
+        The minimum decrease of impurity for a node to be split.
+    """
+
+    def __cinit__(
+        self,
+        list splitters,
+        SIZE_t min_samples_split,
+        SIZE_t min_samples_leaf,
+        double min_weight_leaf,
+        SIZE_t max_depth,
+        double min_impurity_decrease
+    ):
+        self.splitters = splitters
+        self.min_samples_split = min_samples_split
+        self.min_samples_leaf = min_samples_leaf
+        self.min_weight_leaf = min_weight_leaf
+        self.max_depth = max_depth
+        self.min_impurity_decrease = min_impurity_decrease
+
+    cpdef build(
+        self,
+        ObliqueTree tree,
+        object X,
+        const DOUBLE_t[:, ::1] y,
+        const DOUBLE_t[:] sample_weight=None
+    ):
+        """Build an oblique decision tree from the training set (X, y)."""
+        # check input
+        X, y, sample_weight = self._check_input(X, y, sample_weight)
+
+        cdef BaseObliqueSplitter splitter = self.splitters[0]
+        cdef BaseObliqueSplitter other
+        cdef SIZE_t n_threads = len(self.splitters)
+        cdef SIZE_t n_level_nodes, i
+        cdef SIZE_t node_id
+        cdef SIZE_t max_depth_seen = -1
+        cdef vector[LevelRecord] next_level
+        cdef LevelRecord record
+        cdef int init_capacity
+        cdef int rc = 0
+
+        if tree.max_depth <= 10:
+            init_capacity = (2 ** (tree.max_depth + 1)) - 1
+        else:
+            init_capacity = 2047
+
+        tree._resize(init_capacity)
+
+        # any splitter may project the root with all threads, so their scratch
+        # buffers are sized for all of them before they are allocated by init
+        for other in self.splitters:
+            other.n_threads = n_threads
+
+        # all splitters partition the same samples array
+        splitter.init(X, y, sample_weight)
+        for other in self.splitters[1:]:
+            other.init(X, y, sample_weight)
+            other.samples = splitter.samples
+
+        self.value_stride = tree.value_stride
+        self.rand_r_state = splitter.rand_r_state
+        self.level.clear()
+        self.level.push_back({
+            "start": 0,
+            "end": splitter.n_samples,
+            "depth": 0,
+            "parent": _TREE_UNDEFINED,
+            "is_left": 0,
+            "is_leaf": 0,
+            "impurity": INFINITY,
+            "weighted_n_node_samples": 0.0,
+            "n_constant_features": 0,
+            "rand_r_state": rand_int(0, RAND_R_MAX, &self.rand_r_state)})
+
+        with Parallel(n_jobs=n_threads, prefer="threads") as parallel:
+            while not self.level.empty():
+                n_level_nodes = self.level.size()
+                self.level_splits.resize(n_level_nodes)
+                # the projection vectors of the largest level so far are kept,
+                # so that their memory is reused rather than allocated per node
+                if self.level_proj_weights.size() < <size_t>n_level_nodes:
+                    self.level_proj_weights.resize(n_level_nodes)
+                    self.level_proj_indices.resize(n_level_nodes)
+                self.level_values.resize(n_level_nodes * self.value_stride)
+                self.next_node = 0
+
+                # the threads left over by levels with fewer nodes than threads,
+                # e.g. the root, compute the projections of the large nodes
+                for other in self.splitters:
+                    other.n_node_threads = max(1, n_threads // n_level_nodes)
+
+                parallel(
+                    delayed(self._split_level)(other)
+                    for other in self.splitters[:min(n_threads, n_level_nodes)]
+                )
+
+                with nogil:
+                    for i in range(n_level_nodes):
+                        record = self.level[i]
+                        node_id = tree._add_node(
+                            record.parent, record.is_left, record.is_leaf,
+                            <SplitRecord*>&self.level_splits[i], record.impurity,
+                            record.end - record.start, record.weighted_n_node_samples
+                        )
+                        if node_id == INTPTR_MAX:
+                            rc = -1
+                            break
+
+                        memcpy(tree.value + node_id * self.value_stride,
+                               &self.level_values[i * self.value_stride],
+                               self.value_stride * sizeof(double))
+
+                        if not record.is_leaf:
+                            # add the left child before the right child
+                            next_level.push_back({
+                                "start": record.start,
+                                "end": self.level_splits[i].pos,
+                                "depth": record.depth + 1,
+                                "parent": node_id,
+                                "is_left": 1,
+                                "is_leaf": 0,
+                                "impurity": self.level_splits[i].impurity_left,
+                                "weighted_n_node_samples": 0.0,
+                                "n_constant_features": record.n_constant_features,
+                                "rand_r_state": rand_int(0, RAND_R_MAX, &self.rand_r_state)})
+                            next_level.push_back({
+                                "start": self.level_splits[i].pos,
+                                "end": record.end,
+                                "depth": record.depth + 1,
+                                "parent": node_id,
+                                "is_left": 0,
+                                "is_leaf": 0,
+                                "impurity": self.level_splits[i].impurity_right,
+                                "weighted_n_node_samples": 0.0,
+                                "n_constant_features": record.n_constant_features,
+                                "rand_r_state": rand_int(0, RAND_R_MAX, &self.rand_r_state)})
+
+                        if record.depth > max_depth_seen:
+                            max_depth_seen = record.depth
+
+                    self.level.swap(next_level)
+                    next_level.clear()
+
+                if rc == -1:
+                    raise MemoryError()
+
+        rc = tree._resize_c(tree.node_count)
+        if rc == -1:
+            raise MemoryError()
+        tree.max_depth = max_depth_seen
+
+    cdef inline _check_input(
+        self,
+        object X,
+        const DOUBLE_t[:, ::1] y,
+        const DOUBLE_t[:] sample_weight,
+    ):
+        """Check input dtype, layout and format"""
+        if issparse(X):
+            X = X.tocsc()
+            X.sort_indices()
+
+            if X.data.dtype != DTYPE:
+                X.data = np.ascontiguousarray(X.data, dtype=DTYPE)
+
+            if X.indices.dtype != np.int32 or X.indptr.dtype != np.int32:
+                raise ValueError("No support for np.int64 index based "
+                                 "sparse matrices")
+
+        elif X.dtype != DTYPE:
+            # since we have to copy we will make it fortran for efficiency
+            X = np.asfortranarray(X, dtype=DTYPE)
+
+        if y.base.dtype != DOUBLE or not y.base.flags.contiguous:
+            y = np.ascontiguousarray(y, dtype=DOUBLE)
+
+        if (sample_weight is not None and
+            (sample_weight.base.dtype != DOUBLE or not
+             sample_weight.base.flags.contiguous)):
+            sample_weight = np.asarray(sample_weight, dtype=DOUBLE, order="C")
+
+        return X, y, sample_weight
+
+    def _split_level(self, BaseObliqueSplitter splitter):
+        """Split the nodes of the current level with ``splitter`` in a thread."""
+        with nogil:
+            self._split_nodes(splitter)
+
+    cdef int _split_nodes(self, BaseObliqueSplitter splitter) except -1 nogil:
+        """Split the next node of the current level until all of them are split.
+
+        Returns -1 in case of failure to allocate memory (and raise MemoryError)
+        or 0 otherwise.
+        """
+        cdef LevelRecord* record
+        cdef ObliqueSplitRecord* split
+        cdef SIZE_t n_node_samples
+        cdef SIZE_t i
+
+        while True:
+            # the nodes are handed out one at a time, as their sizes vary widely
+            with gil:
+                i = self.next_node
+                self.next_node += 1
+            if i >= <SIZE_t>self.level.size():
+                return 0
+
+            record = &self.level[i]
+            split = &self.level_splits[i]
+            n_node_samples = record.end - record.start
+
+            splitter.rand_r_state = record.rand_r_state
+            if splitter.node_reset(record.start, record.end,
+                                   &record.weighted_n_node_samples) == -1:
+                return -1
+            if record.parent == _TREE_UNDEFINED:
+                record.impurity = splitter.node_impurity()
+
+            record.is_leaf = (record.depth >= self.max_depth or
+                              n_node_samples < self.min_samples_split or
+                              n_node_samples < 2 * self.min_samples_leaf or
+                              record.weighted_n_node_samples < 2 * self.min_weight_leaf or
+                              # impurity == 0 with tolerance due to rounding errors
+                              record.impurity <= EPSILON)
+
+            if not record.is_leaf:
+                # the children start from the constant features found in the node
+                if splitter.node_split(record.impurity, <SplitRecord*>split,
+                                       &record.n_constant_features) == -1:
+                    return -1
+
+                # If EPSILON=0 in the below comparison, float precision
+                # issues stop splitting, producing trees that are
+                # dissimilar to v0.18
+                record.is_leaf = (split.pos >= record.end or
+                                  split.improvement + EPSILON < self.min_impurity_decrease)
+
+            if not record.is_leaf:
+                # keep the projection vector, which the splitter overwrites for
+                # the next node it splits
+                self.level_proj_weights[i] = deref(split.proj_vec_weights)
+                self.level_proj_indices[i] = deref(split.proj_vec_indices)
+                split.proj_vec_weights = &self.level_proj_weights[i]
+                split.proj_vec_indices = &self.level_proj_indices[i]
+
+            splitter.node_value(&self.level_values[i * self.value_stride])
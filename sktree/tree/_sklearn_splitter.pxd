@@ -8,3 +8,12 @@ from sklearn.tree._tree cimport UINT32_t  # Unsigned 32 bit integer
 
 # TODO: remove these files when sklearn merges refactor defining these in pxd files
 cdef void sort(DTYPE_t* Xf, SIZE_t* samples, SIZE_t n) noexcept nogil
+
+# Sorts of the splitters of this package
+cdef void radix_sort(
+    DTYPE_t* Xf,
+    SIZE_t* samples,
+    UINT32_t* keys_buffer,
+    SIZE_t* samples_buffer,
+    SIZE_t n
+) noexcept nogil
@@ -2,7 +2,7 @@
 # cython: boundscheck=False, wraparound=False, initializedcheck=False, cdivision=True
 
 from libc.stdlib cimport qsort
-from libc.string cimport memcpy
+from libc.string cimport memcpy, memset
 from sklearn.tree._utils cimport log
 
 
@@ -124,6 +124,101 @@ cdef void heapsort(DTYPE_t* Xf, SIZE_t* samples, SIZE_t n) noexcept nogil:
         end = end - 1
 
 
+# Below this number of samples, the introsort is faster than the radix sort, in
+# particular for the many duplicated values of projections of discrete features
+cdef SIZE_t RADIX_SORT_MIN_SAMPLES = 1024
+
+
+cdef inline UINT32_t float_to_key(UINT32_t bits) noexcept nogil:
+    # Map the bits of a float to an unsigned integer with the same order: the
+    # sign bit of positive floats is set, and all bits of negative floats are
+    # flipped so that larger magnitudes come first.
+    return bits ^ ((-(bits >> 31)) | 0x80000000u)
+
+
+cdef inline UINT32_t key_to_float(UINT32_t key) noexcept nogil:
+    # Inverse of float_to_key
+    return key ^ (((key >> 31) - 1) | 0x80000000u)
+
+
+# Sort n-element arrays pointed to by Xf and samples, simultaneously, by the
+# values in Xf. Algorithm: LSD radix sort on the bits of the float32 values,
+# one byte per pass, with the introsort above for small arrays.
+#
+# Unlike the introsort, which takes ~n log n unpredictable comparisons, each
+# pass does a sequential read and 256 sequential writes, so the sort is
+# several times faster on the continuous projections of large nodes. The
+# histograms of all bytes are computed in the first pass, and the passes over
+# bytes that all keys share (e.g. the low bytes of small integers) are
+# skipped. keys_buffer and samples_buffer must hold n elements.
+cdef void radix_sort(
+    DTYPE_t* Xf,
+    SIZE_t* samples,
+    UINT32_t* keys_buffer,
+    SIZE_t* samples_buffer,
+    SIZE_t n
+) noexcept nogil:
+    # the keys are computed in place of the values, which have the same size
+    cdef UINT32_t* keys = <UINT32_t*>Xf
+    cdef UINT32_t* keys_out = keys_buffer
+    cdef SIZE_t* samples_out = samples_buffer
+    cdef UINT32_t* tmp_keys
+    cdef SIZE_t* tmp_samples
+    cdef SIZE_t counts[4][256]
+    cdef SIZE_t i, offset, count
+    cdef UINT32_t key
+    cdef int b, shift
+
+    if n < RADIX_SORT_MIN_SAMPLES:
+        sort(Xf, samples, n)
+        return
+
+    memset(counts, 0, sizeof(counts))
+    for i in range(n):
+        key = float_to_key(keys[i])
+        keys[i] = key
+        counts[0][key & 0xFF] += 1
+        counts[1][(key >> 8) & 0xFF] += 1
+        counts[2][(key >> 16) & 0xFF] += 1
+        counts[3][key >> 24] += 1
+
+    for b in range(4):
+        shift = 8 * b
+        if counts[b][(keys[0] >> shift) & 0xFF] == n:
+            continue
+
+        # turn the histogram into the positions of the first key of each byte
+        offset = 0
+        for i in range(256):
+            count = counts[b][i]
+            counts[b][i] = offset
+            offset += count
+
+        # stable scatter, which keeps the order of the previous passes
+        for i in range(n):
+            key = keys[i]
+            count = counts[b][(key >> shift) & 0xFF]
+            counts[b][(key >> shift) & 0xFF] = count + 1
+            keys_out[count] = key
+            samples_out[count] = samples[i]
+
+        tmp_keys = keys
+        keys = keys_out
+        keys_out = tmp_keys
+        tmp_samples = samples
+        samples = samples_out
+        samples_out = tmp_samples
+
+    # an odd number of passes leaves the sorted arrays in the buffers
+    if keys != <UINT32_t*>Xf:
+        memcpy(Xf, keys, n * sizeof(UINT32_t))
+        memcpy(samples_out, samples, n * sizeof(SIZE_t))
+
+    keys = <UINT32_t*>Xf
+    for i in range(n):
+        keys[i] = key_to_float(keys[i])
+
+
 cdef int compare_SIZE_t(const void* a, const void* b) noexcept nogil:
     """Comparison function for sort."""
     return <int>((<SIZE_t*>a)[0] - (<SIZE_t*>b)[0])
@@ -38,6 +38,17 @@ cdef class UnsupervisedCriterion(BaseCriterion):
     cdef double sum_left    # Same as above, but for the left side of the split
     cdef double sum_right   # Same as above, but for the right side of the split
 
+    # Running totals of the weighted squares of Xf[samples[start:end]], so that
+    # the sum of squares of any child can be computed in constant time rather
+    # than by a pass over its samples for every candidate split point. The sums
+    # and the sums of squares are of the feature values minus ``shift``, which
+    # is a value of the node, so that they do not cancel when the mean of the
+    # feature is large compared to its spread.
+    cdef double shift           # The value the feature is shifted by in the node.
+    cdef double sum_sq_total    # The sum of the weighted squares of each feature.
+    cdef double sum_sq_left     # Same as above, but for the left side of the split
+    cdef double sum_sq_right    # Same as above, but for the right side of the split
+
     # Methods
     # -------
     # The 'init' method is copied here with the almost the exact same signature
@@ -59,4 +70,6 @@ cdef class UnsupervisedCriterion(BaseCriterion):
         self,
         SIZE_t start,
         SIZE_t end
-    ) nogil
\ No newline at end of file
+    ) nogil
+
+    cpdef UnsupervisedCriterion clone(self)
\ No newline at end of file
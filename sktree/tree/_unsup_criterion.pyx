@@ -38,10 +38,25 @@ cdef class UnsupervisedCriterion(BaseCriterion):
         self.sum_total = 0.0
         self.sum_left = 0.0
         self.sum_right = 0.0
+        self.shift = 0.0
+        self.sum_sq_total = 0.0
+        self.sum_sq_left = 0.0
+        self.sum_sq_right = 0.0
 
     def __reduce__(self):
         return (type(self), (), self.__getstate__())
 
+    cpdef UnsupervisedCriterion clone(self):
+        """Return a new criterion of the same type and with the same state.
+
+        This is equivalent to, but much cheaper than, ``copy.deepcopy``. All
+        the running statistics are reset when the criterion is initialized, so
+        only the state that is pickled needs to be copied.
+        """
+        cdef UnsupervisedCriterion criterion = type(self)()
+        criterion.__setstate__(self.__getstate__())
+        return criterion
+
     cdef void init_feature_vec(
         self,
         const DTYPE_t[:] Xf,
@@ -61,13 +76,22 @@ cdef class UnsupervisedCriterion(BaseCriterion):
         """
         self.Xf = Xf
 
-        # also compute the sum total
+        # also compute the sum total, whereas the weight of the node does not
+        # depend on the feature vector and is set by ``set_sample_pointers``
         self.sum_total = 0.0
-        self.weighted_n_node_samples = 0.0
+        self.sum_sq_total = 0.0
         cdef SIZE_t s_idx
         cdef SIZE_t p_idx
 
         cdef DOUBLE_t w = 1.0
+        cdef DOUBLE_t x
+
+        # the values are shifted by the value of the first sample, which is
+        # within the spread of the values of the node from their mean
+        self.shift = 0.0
+        if self.end > self.start:
+            self.shift = self.Xf[self.sample_indices[self.start]]
+
         for p_idx in range(self.start, self.end):
             s_idx = self.sample_indices[p_idx]
 
@@ -76,8 +100,9 @@ cdef class UnsupervisedCriterion(BaseCriterion):
             if self.sample_weight is not None:
                 w = self.sample_weight[s_idx]
 
-            self.sum_total += self.Xf[s_idx] * w
-            self.weighted_n_node_samples += w
+            x = self.Xf[s_idx] - self.shift
+            self.sum_total += x * w
+            self.sum_sq_total += x * x * w
 
         # Reset to pos=start
         self.reset()
@@ -120,6 +145,8 @@ cdef class UnsupervisedCriterion(BaseCriterion):
         self.weighted_n_right = self.weighted_n_node_samples
         self.sum_left = 0.0
         self.sum_right = self.sum_total
+        self.sum_sq_left = 0.0
+        self.sum_sq_right = self.sum_sq_total
         return 0
 
     cdef int reverse_reset(self) except -1 nogil:
@@ -134,6 +161,8 @@ cdef class UnsupervisedCriterion(BaseCriterion):
         self.weighted_n_right = 0.0
         self.sum_right = 0.0
         self.sum_left = self.sum_total
+        self.sum_sq_right = 0.0
+        self.sum_sq_left = self.sum_sq_total
         return 0
 
     cdef int update(
@@ -160,6 +189,8 @@ cdef class UnsupervisedCriterion(BaseCriterion):
         cdef SIZE_t i
         cdef SIZE_t p
         cdef DOUBLE_t w = 1.0
+        cdef DOUBLE_t x
+        cdef double shift = self.shift
 
         # Update statistics up to new_pos
         #
@@ -177,7 +208,9 @@ cdef class UnsupervisedCriterion(BaseCriterion):
 
                 # accumulate the values of the feature vectors weighted
                 # by the sample weight
-                self.sum_left += self.Xf[i] * w
+                x = self.Xf[i] - shift
+                self.sum_left += x * w
+                self.sum_sq_left += x * x * w
 
                 # keep track of the weighted count of each sample
                 self.weighted_n_left += w
@@ -190,7 +223,9 @@ cdef class UnsupervisedCriterion(BaseCriterion):
                 if sample_weight is not None:
                     w = sample_weight[i]
 
-                self.sum_left -= self.Xf[i] * w
+                x = self.Xf[i] - shift
+                self.sum_left -= x * w
+                self.sum_sq_left -= x * x * w
 
                 self.weighted_n_left -= w
 
@@ -198,6 +233,7 @@ cdef class UnsupervisedCriterion(BaseCriterion):
         self.weighted_n_right = (self.weighted_n_node_samples -
                                  self.weighted_n_left)
         self.sum_right = self.sum_total - self.sum_left
+        self.sum_sq_right = self.sum_sq_total - self.sum_sq_left
 
         self.pos = new_pos
         return 0
@@ -213,8 +249,9 @@ cdef class UnsupervisedCriterion(BaseCriterion):
         dest : double pointer
             The memory address which we will save the node value into.
         """
-        # set values at the address pointer is pointing to with the total value
-        dest[0] = self.sum_total
+        # set values at the address pointer is pointing to with the total value,
+        # which is the sum of the unshifted values
+        dest[0] = self.sum_total + self.shift * self.weighted_n_node_samples
 
     cdef void set_sample_pointers(
         self,
@@ -223,9 +260,10 @@ cdef class UnsupervisedCriterion(BaseCriterion):
     ) nogil:
         """Set sample pointers in the criterion.
 
-        Set given start and end sample_indices. Also will update node statistics,
-        such as the `sum_total`, which tracks the total value within the current
-        node for sample_indices[start:end].
+        Set given start and end sample_indices. Also will update the node
+        statistics that do not depend on the feature vector, i.e. the
+        `weighted_n_node_samples` of sample_indices[start:end], whereas the
+        `sum_total` is updated by `init_feature_vec`.
 
         Parameters
         ----------
@@ -234,10 +272,20 @@ cdef class UnsupervisedCriterion(BaseCriterion):
         end : SIZE_t
             The end sample pointer.
         """
+        cdef SIZE_t p_idx
+
         self.n_node_samples = end - start
         self.start = start
         self.end = end
 
+        # computed once per node, rather than for every feature vector
+        if self.sample_weight is None:
+            self.weighted_n_node_samples = self.n_node_samples
+        else:
+            self.weighted_n_node_samples = 0.0
+            for p_idx in range(start, end):
+                self.weighted_n_node_samples += self.sample_weight[self.sample_indices[p_idx]]
+
 
 cdef class TwoMeans(UnsupervisedCriterion):
     r"""Two means split impurity.
@@ -256,7 +304,12 @@ cdef class TwoMeans(UnsupervisedCriterion):
 
     The variance of the node, left child and right child is computed by keeping track of
     `sum_total`, `sum_left` and `sum_right`, which are the sums of a feature vector at
-    varying split points.
+    varying split points, and of `sum_sq_total`, `sum_sq_left` and `sum_sq_right`, which
+    are the corresponding sums of squares. The sum of squared deviations from the mean
+    then follows as ``sum_sq - sum**2 / weight``, so that evaluating a split point does not
+    require another pass over the samples of each child. All sums are of the feature
+    values minus a value of the node, ``shift``, so that the two terms do not cancel
+    when the mean of the feature is large compared to its spread.
 
     Weighted Mean and Variance
     --------------------------
@@ -298,7 +351,6 @@ cdef class TwoMeans(UnsupervisedCriterion):
         i.e. the variance of Xf[sample_indices[start:end]]. The smaller the impurity the
         better.
         """
-        cdef double mean
         cdef double impurity
         cdef SIZE_t n_node_samples = self.n_node_samples
 
@@ -309,14 +361,11 @@ cdef class TwoMeans(UnsupervisedCriterion):
                     'Xf has not been set yet, so one must call init_feature_vec.'
                 )
 
-        # first compute mean
-        mean = self.sum_total / self.weighted_n_node_samples
-
-        # then compute the impurity as the variance
+        # compute the impurity as the variance
         impurity = self.sum_of_squares(
-            self.start,
-            self.end,
-            mean
+            self.sum_sq_total,
+            self.sum_total,
+            self.weighted_n_node_samples
         ) / self.weighted_n_node_samples
         return impurity
 
@@ -344,65 +393,52 @@ cdef class TwoMeans(UnsupervisedCriterion):
         impurity_right : double pointer
             The memory address to save the impurity of the right node
         """
-        cdef SIZE_t pos = self.pos
-        cdef SIZE_t start = self.start
-        cdef SIZE_t end = self.end
-
-        # first compute mean of left and right
-        mean_left = self.sum_left / self.weighted_n_left
-        mean_right = self.sum_right / self.weighted_n_right
-
         # set values at the address pointer is pointing to with the variance
         # of the left and right child
         impurity_left[0] = self.sum_of_squares(
-            start,
-            pos,
-            mean_left
+            self.sum_sq_left,
+            self.sum_left,
+            self.weighted_n_left
         ) / self.weighted_n_left
         impurity_right[0] = self.sum_of_squares(
-            pos,
-            end,
-            mean_right
+            self.sum_sq_right,
+            self.sum_right,
+            self.weighted_n_right
         ) / self.weighted_n_right
 
 
     cdef double sum_of_squares(
         self,
-        SIZE_t start,
-        SIZE_t end,
-        double mean,
+        double sum_sq,
+        double sum_,
+        double weighted_n,
     ) noexcept nogil:
-        """Computes variance of feature vector from sample_indices[start:end].
+        """Computes the weighted sum of squared deviations from the mean.
 
         See: https://en.wikipedia.org/wiki/Weighted_arithmetic_mean#Weighted_sample_variance.  # noqa
 
         Parameters
         ----------
-        start : SIZE_t
-            The start pointer
-        end : SIZE_t
-            The end pointer.
-        mean : double
-            The precomputed mean.
+        sum_sq : double
+            The weighted sum of squares of the shifted feature vector, e.g.
+            ``sum_sq_left``.
+        sum_ : double
+            The weighted sum of the shifted feature vector, e.g. ``sum_left``.
+        weighted_n : double
+            The weighted number of samples, e.g. ``weighted_n_left``.
 
         Returns
         -------
         ss : double
             Sum of squares
         """
-        cdef SIZE_t s_idx, p_idx        # initialize sample and pointer index
-        cdef double ss = 0.0            # sum-of-squares
-        cdef DOUBLE_t w = 1.0           # optional weight
+        cdef double ss = sum_sq - sum_ * sum_ / weighted_n
 
-        # calculate variance for the sample_indices chosen start:end
-        for p_idx in range(start, end):
-            s_idx = self.sample_indices[p_idx]
-
-            # include optional weighted sum of squares
-            if self.sample_weight is not None:
-                w = self.sample_weight[s_idx]
-
-            ss += w * (self.Xf[s_idx] - mean) * (self.Xf[s_idx] - mean)
+        # the sums are shifted, so round-off is relative to the spread of the
+        # values rather than to their magnitude, but it can still make the sum
+        # of squares of a constant child slightly negative
+        if ss < 0.0:
+            ss = 0.0
         return ss
 
 cdef class FastBIC(TwoMeans):
@@ -482,7 +518,6 @@ cdef class FastBIC(TwoMeans):
         Namely, this is the maximum likelihood of Xf[sample_indices[start:end]].
         The smaller the impurity the better.
         """
-        cdef double mean
         cdef double variance
         cdef double impurity
         cdef SIZE_t n_node_samples = self.n_node_samples
@@ -494,14 +529,11 @@ cdef class FastBIC(TwoMeans):
                     'Xf has not been set yet, so one must call init_feature_vec.'
                 )
 
-        # first compute mean
-        mean = self.sum_total / self.weighted_n_node_samples
-
-        # then compute the variance of the cluster
+        # compute the variance of the cluster
         variance = self.sum_of_squares(
-            self.start,
-            self.end,
-            mean
+            self.sum_sq_total,
+            self.sum_total,
+            self.weighted_n_node_samples
         ) / self.weighted_n_node_samples
 
         # Compute the BIC of the current set of samples
@@ -532,7 +564,6 @@ cdef class FastBIC(TwoMeans):
         cdef SIZE_t end = self.end
         cdef SIZE_t n_samples_left, n_samples_right
 
-        cdef double mean_left, mean_right
         cdef double ss_left, ss_right, variance_left, variance_right, variance_comb
         cdef double BIC_diff_var_left, BIC_diff_var_right
         cdef double BIC_same_var_left, BIC_same_var_right
@@ -542,20 +573,16 @@ cdef class FastBIC(TwoMeans):
         n_samples_left = pos - start
         n_samples_right = end - pos
 
-        # first compute mean of left and right
-        mean_left = self.sum_left / self.weighted_n_left
-        mean_right = self.sum_right / self.weighted_n_right
-
         # compute the estimated variance of the left and right children
         ss_left = self.sum_of_squares(
-            start,
-            pos,
-            mean_left
+            self.sum_sq_left,
+            self.sum_left,
+            self.weighted_n_left
         )
         ss_right = self.sum_of_squares(
-            pos,
-            end,
-            mean_right
+            self.sum_sq_right,
+            self.sum_right,
+            self.weighted_n_right
         )
         variance_left = ss_left / self.weighted_n_left
         variance_right = ss_right / self.weighted_n_right
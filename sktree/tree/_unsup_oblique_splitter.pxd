@@ -43,6 +43,8 @@ cdef class UnsupervisedObliqueSplitter(UnsupervisedSplitter):
     cdef vector[vector[DTYPE_t]] proj_mat_weights       # nonzero weights of sparse proj_mat matrix
     cdef vector[vector[SIZE_t]] proj_mat_indices        # nonzero indices of sparse proj_mat matrix
     cdef SIZE_t[::1] indices_to_sample                  # an array of indices to sample of size mtry X n_features
+    cdef UINT32_t[::1] sort_keys_buffer                 # (n_samples,) sorted keys of a radix sort pass
+    cdef SIZE_t[::1] sort_samples_buffer                # (n_samples,) sorted samples of a radix sort pass
 
     # All oblique splitters (i.e. non-axis aligned splitters) require a
     # function to sample a projection matrix that is applied to the feature matrix
@@ -13,7 +13,7 @@ from cython.operator cimport dereference as deref
 from libcpp.vector cimport vector
 from sklearn.tree._utils cimport rand_int
 
-from ._sklearn_splitter cimport sort
+from ._sklearn_splitter cimport radix_sort
 from ._unsup_criterion cimport UnsupervisedCriterion
 
 
@@ -99,7 +99,7 @@ cdef class UnsupervisedObliqueSplitter(UnsupervisedSplitter):
         self.proj_mat_indices = vector[vector[SIZE_t]](self.max_features)
 
         # or max w/ 1...
-        self.n_non_zeros = max(int(self.max_features * self.feature_combinations), 1)
+        self.n_non_zeros = max(<SIZE_t>(self.max_features * self.feature_combinations), 1)
 
     def __getstate__(self):
         return {}
@@ -117,6 +117,11 @@ cdef class UnsupervisedObliqueSplitter(UnsupervisedSplitter):
         # create a helper array for allowing efficient Fisher-Yates
         self.indices_to_sample = np.arange(self.max_features * self.n_features,
                                            dtype=np.intp)
+
+        # the radix sort scatters into buffers that hold all samples, which are
+        # allocated once rather than for every node
+        self.sort_keys_buffer = np.empty(self.n_samples, dtype=np.uint32)
+        self.sort_samples_buffer = np.empty(self.n_samples, dtype=np.intp)
         return 0
 
     cdef int node_reset(self, SIZE_t start, SIZE_t end,
@@ -179,9 +184,12 @@ cdef class BestObliqueUnsupervisedSplitter(UnsupervisedObliqueSplitter):
         cdef SIZE_t[::1] indices_to_sample = self.indices_to_sample
         cdef SIZE_t grid_size = self.max_features * self.n_features
 
-        # shuffle indices over the 2D grid to sample using Fisher-Yates
-        for i in range(0, grid_size):
-            j = rand_int(0, grid_size - i, random_state)
+        # shuffle the first 'n_non_zeros' indices over the 2D grid using
+        # Fisher-Yates, which is all that is sampled from it. As the grid is
+        # only permuted, it need not be reset between nodes, and the cost of a
+        # node does not grow with the size of the grid
+        for i in range(0, n_non_zeros):
+            j = rand_int(i, grid_size, random_state)
             indices_to_sample[j], indices_to_sample[i] = \
                 indices_to_sample[i], indices_to_sample[j]
 
@@ -233,6 +241,11 @@ cdef class BestObliqueUnsupervisedSplitter(UnsupervisedObliqueSplitter):
         cdef SIZE_t partition_end
         cdef DTYPE_t temp_d         # to compute a projection feature value
 
+        cdef const DTYPE_t[:, :] X = self.X
+        cdef const SIZE_t* proj_indices
+        cdef const DTYPE_t* proj_weights
+        cdef SIZE_t n_proj_nonzeros
+
         # instantiate the split records
         _init_split(&best_split, end)
 
@@ -253,16 +266,20 @@ cdef class BestObliqueUnsupervisedSplitter(UnsupervisedObliqueSplitter):
 
             # Compute linear combination of features and then
             # sort samples according to the feature values.
+            proj_indices = current_split.proj_vec_indices.data()
+            proj_weights = current_split.proj_vec_weights.data()
+            n_proj_nonzeros = current_split.proj_vec_indices.size()
             for idx in range(start, end):
-                # initialize the feature value to 0
-                feature_values[idx] = 0
-                for jdx in range(0, current_split.proj_vec_indices.size()):
-                    feature_values[idx] += self.X[
-                        samples[idx], deref(current_split.proj_vec_indices)[jdx]
-                    ] * deref(current_split.proj_vec_weights)[jdx]
+                # accumulate in a register rather than in feature_values, in
+                # the same float32 precision
+                temp_d = 0
+                for jdx in range(0, n_proj_nonzeros):
+                    temp_d += X[samples[idx], proj_indices[jdx]] * proj_weights[jdx]
+                feature_values[idx] = temp_d
 
             # Sort the samples
-            sort(&feature_values[start], &samples[start], end - start)
+            radix_sort(&feature_values[start], &samples[start], &self.sort_keys_buffer[0],
+                       &self.sort_samples_buffer[0], end - start)
 
             # initialize feature vector for criterion to evaluate
             # GIL is needed since we are changing the criterion's internal memory
@@ -314,12 +331,15 @@ cdef class BestObliqueUnsupervisedSplitter(UnsupervisedObliqueSplitter):
             partition_end = end
             p = start
 
+            proj_indices = best_split.proj_vec_indices.data()
+            proj_weights = best_split.proj_vec_weights.data()
+            n_proj_nonzeros = best_split.proj_vec_indices.size()
+
             while p < partition_end:
                 # Account for projection vector
                 temp_d = 0.0
-                for j in range(best_split.proj_vec_indices.size()):
-                    temp_d += self.X[samples[p], deref(best_split.proj_vec_indices)[j]] *\
-                                deref(best_split.proj_vec_weights)[j]
+                for jdx in range(0, n_proj_nonzeros):
+                    temp_d += X[samples[p], proj_indices[jdx]] * proj_weights[jdx]
 
                 if temp_d <= best_split.threshold:
                     p += 1
@@ -23,8 +23,13 @@ from ._unsup_tree cimport UnsupervisedTree
 
 
 cdef class UnsupervisedObliqueTree(UnsupervisedTree):
-    cdef vector[vector[DTYPE_t]] proj_vec_weights # (capacity, n_features) array of projection vectors
-    cdef vector[vector[SIZE_t]] proj_vec_indices  # (capacity, n_features) array of projection vectors
+    # the projection vectors of the split nodes are stored one after the other
+    # in the order the nodes are added, rather than in a vector per node, where
+    # the vector of node i is proj_vec_weights[proj_vec_start[i]:proj_vec_end[i]]
+    cdef vector[DTYPE_t] proj_vec_weights         # weights of the non-zeros of all projection vectors
+    cdef vector[SIZE_t] proj_vec_indices          # features of the non-zeros of all projection vectors
+    cdef vector[SIZE_t] proj_vec_start            # (capacity,) start of the projection vector of each node
+    cdef vector[SIZE_t] proj_vec_end              # (capacity,) end of the projection vector of each node
 
     # overridden methods
     cdef int _resize_c(
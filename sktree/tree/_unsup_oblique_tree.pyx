@@ -100,9 +100,6 @@ cdef class UnsupervisedObliqueTree(UnsupervisedTree):
         self.value = NULL
         self.nodes = NULL
 
-        self.proj_vec_weights = vector[vector[DTYPE_t]](self.capacity)
-        self.proj_vec_indices = vector[vector[SIZE_t]](self.capacity)
-
     def __reduce__(self):
         """Reduce re-implementation, for pickling."""
         return (UnsupervisedObliqueTree, (self.n_features,), self.__getstate__())
@@ -148,13 +145,17 @@ cdef class UnsupervisedObliqueTree(UnsupervisedTree):
         # now set the projection vector weights and indices
         proj_vecs = d['proj_vecs']
         self.n_features = proj_vecs.shape[1]
+        self.proj_vec_weights.clear()
+        self.proj_vec_indices.clear()
         for i in range(0, self.node_count):
+            self.proj_vec_start[i] = self.proj_vec_weights.size()
             for j in range(0, self.n_features):
                 weight = proj_vecs[i, j]
                 if weight == 0:
                     continue
-                self.proj_vec_weights[i].push_back(weight)
-                self.proj_vec_indices[i].push_back(j)
+                self.proj_vec_weights.push_back(weight)
+                self.proj_vec_indices.push_back(j)
+            self.proj_vec_end[i] = self.proj_vec_weights.size()
 
         nodes = memcpy(self.nodes, cnp.PyArray_DATA(node_ndarray),
                        self.capacity * sizeof(Node))
@@ -165,9 +166,9 @@ cdef class UnsupervisedObliqueTree(UnsupervisedTree):
         """Get the projection matrix of shape (node_count, n_features)."""
         proj_vecs = np.zeros((self.node_count, self.n_features), dtype=np.float64)
         for i in range(0, self.node_count):
-            for j in range(0, self.proj_vec_weights[i].size()):
-                weight = self.proj_vec_weights[i][j]
-                feat = self.proj_vec_indices[i][j]
+            for j in range(self.proj_vec_start[i], self.proj_vec_end[i]):
+                weight = self.proj_vec_weights[j]
+                feat = self.proj_vec_indices[j]
                 proj_vecs[i, feat] = weight
         return proj_vecs
 
@@ -191,11 +192,10 @@ cdef class UnsupervisedObliqueTree(UnsupervisedTree):
         safe_realloc(&self.nodes, capacity)
         safe_realloc(&self.value, capacity * self.value_stride)
 
-        # only thing added for oblique trees
-        # TODO: this could possibly be removed if we can add projection indices and
-        # weights to Node
-        self.proj_vec_weights.resize(capacity)
-        self.proj_vec_indices.resize(capacity)
+        # only thing added for oblique trees, where the new nodes have empty
+        # projection vectors until they are split
+        self.proj_vec_start.resize(capacity)
+        self.proj_vec_end.resize(capacity)
 
         # value memory is initialised to 0 to enable classifier argmax
         if capacity > self.capacity:
@@ -222,13 +222,17 @@ cdef class UnsupervisedObliqueTree(UnsupervisedTree):
         node.threshold = deref(oblique_split_node).threshold
 
         # oblique trees store the projection indices and weights
-        # inside the tree itself
-        self.proj_vec_weights[node_id] = deref(
-            deref(oblique_split_node).proj_vec_weights
-        )
-        self.proj_vec_indices[node_id] = deref(
-            deref(oblique_split_node).proj_vec_indices
-        )
+        # inside the tree itself, appended to those of the previous nodes so
+        # that adding a node does not allocate a vector of its own
+        cdef vector[DTYPE_t]* proj_vec_weights = deref(oblique_split_node).proj_vec_weights
+        cdef vector[SIZE_t]* proj_vec_indices = deref(oblique_split_node).proj_vec_indices
+        cdef SIZE_t j
+
+        self.proj_vec_start[node_id] = self.proj_vec_weights.size()
+        for j in range(proj_vec_weights.size()):
+            self.proj_vec_weights.push_back(deref(proj_vec_weights)[j])
+            self.proj_vec_indices.push_back(deref(proj_vec_indices)[j])
+        self.proj_vec_end[node_id] = self.proj_vec_weights.size()
         return 1
 
     cdef DTYPE_t _compute_feature(
@@ -250,13 +254,10 @@ cdef class UnsupervisedObliqueTree(UnsupervisedTree):
         # get the index of the node
         cdef SIZE_t node_id = node - self.nodes
 
-        # cdef SIZE_t n_projections = proj_vec_indices.size()
         # compute projection of the data based on trained tree
-        # proj_vec_weights = self.proj_vec_weights[node_id]
-        # proj_vec_indices = self.proj_vec_indices[node_id]
-        for j in range(0, self.proj_vec_indices[node_id].size()):
-            feature_index = self.proj_vec_indices[node_id][j]
-            weight = self.proj_vec_weights[node_id][j]
+        for j in range(self.proj_vec_start[node_id], self.proj_vec_end[node_id]):
+            feature_index = self.proj_vec_indices[j]
+            weight = self.proj_vec_weights[j]
 
             # skip a multiplication step if there is nothing to be done
             if weight == 0:
@@ -287,9 +288,9 @@ cdef class UnsupervisedObliqueTree(UnsupervisedTree):
 
         cdef int i, feature_index
         cdef DTYPE_t weight
-        for i in range(0, self.proj_vec_indices[node_id].size()):
-            feature_index = self.proj_vec_indices[node_id][i]
-            weight = self.proj_vec_weights[node_id][i]
+        for i in range(self.proj_vec_start[node_id], self.proj_vec_end[node_id]):
+            feature_index = self.proj_vec_indices[i]
+            weight = self.proj_vec_weights[i]
             if weight < 0:
                 weight *= -1
 
@@ -949,6 +949,75 @@ cdef class UnsupervisedTree(BaseTree):
                 raise ValueError("Total weight should be 1.0 but was %.9f" %
                                  total_weight)
 
+    def _apply_and_group(self, object X):
+        """Find the leaf of each sample in X and group the samples by leaf.
+
+        This fuses ``apply`` with the grouping of the samples: each sample is
+        traversed down the tree once, and the samples are then scattered into
+        their leaf with a counting sort, since leaves are indexed by node ids
+        bounded by ``node_count``.
+
+        Parameters
+        ----------
+        X : {ndarray, sparse matrix} of shape (n_samples, n_features)
+            The input samples, of dtype ``np.float32``.
+
+        Returns
+        -------
+        leaves : ndarray of shape (n_samples,)
+            The index of the leaf each sample ends up in.
+        order : ndarray of shape (n_samples,)
+            The sample indices sorted by leaf. The samples of node ``k`` are
+            ``order[bounds[k]:bounds[k + 1]]``, in increasing order.
+        bounds : ndarray of shape (node_count + 1,)
+            The boundaries of each node in ``order``.
+        """
+        cdef SIZE_t n_samples = X.shape[0]
+        cdef SIZE_t node_count = self.node_count
+        cdef SIZE_t[::1] leaves
+        cdef SIZE_t[::1] order = np.empty(n_samples, dtype=np.intp)
+        cdef SIZE_t[::1] bounds = np.zeros(node_count + 1, dtype=np.intp)
+        cdef SIZE_t[::1] cursor
+        cdef const DTYPE_t[:, :] X_ndarray
+        cdef Node* node
+        cdef SIZE_t i, k
+
+        if issparse(X):
+            leaves = self.apply(X)
+        else:
+            if X.dtype != DTYPE:
+                raise ValueError("X.dtype should be np.float32, got %s" % X.dtype)
+            X_ndarray = X
+            leaves = np.empty(n_samples, dtype=np.intp)
+
+            with nogil:
+                for i in range(n_samples):
+                    node = self.nodes
+                    # While node not a leaf
+                    while node.left_child != _TREE_LEAF:
+                        if self._compute_feature(X_ndarray, i, node) <= node.threshold:
+                            node = &self.nodes[node.left_child]
+                        else:
+                            node = &self.nodes[node.right_child]
+                    leaves[i] = <SIZE_t>(node - self.nodes)
+
+        cursor = np.empty(node_count, dtype=np.intp)
+        with nogil:
+            # count the samples in each leaf and prefix-sum them into bounds
+            for i in range(n_samples):
+                bounds[leaves[i] + 1] += 1
+            for k in range(node_count):
+                bounds[k + 1] += bounds[k]
+                cursor[k] = bounds[k]
+
+            # scatter the samples in increasing order into their leaf
+            for i in range(n_samples):
+                k = leaves[i]
+                order[cursor[k]] = i
+                cursor[k] += 1
+
+        return np.asarray(leaves), np.asarray(order), np.asarray(bounds)
+
 
 def _check_value_ndarray(value_ndarray, expected_dtype, expected_shape):
     if value_ndarray.shape != expected_shape:
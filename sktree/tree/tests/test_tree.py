@@ -1,14 +1,24 @@
+import pickle
+
 import joblib
 import numpy as np
 import pytest
-from numpy.testing import assert_almost_equal, assert_array_almost_equal, assert_array_equal
+from numpy.testing import (
+    assert_allclose,
+    assert_almost_equal,
+    assert_array_almost_equal,
+    assert_array_equal,
+)
+from scipy.sparse import issparse
 from sklearn import datasets
 from sklearn.base import is_classifier
 from sklearn.cluster import AgglomerativeClustering
-from sklearn.datasets import make_blobs
+from sklearn.datasets import make_blobs, make_classification
 from sklearn.metrics import accuracy_score, adjusted_rand_score
+from sklearn.metrics.pairwise import euclidean_distances
 from sklearn.model_selection import cross_val_score
 from sklearn.tree import DecisionTreeClassifier
+from sklearn.tree._criterion import Entropy, Gini
 from sklearn.tree._tree import TREE_LEAF
 from sklearn.utils.estimator_checks import parametrize_with_checks
 
@@ -18,6 +28,8 @@ from sktree.tree import (
     UnsupervisedDecisionTree,
     UnsupervisedObliqueDecisionTree,
 )
+from sktree.tree._classes import _affinity_embedding, _clone_criterion
+from sktree.tree._unsup_criterion import FastBIC, TwoMeans
 
 CLUSTER_CRITERIONS = ("twomeans", "fastbic")
 
@@ -169,7 +181,7 @@ def test_check_simulation(name, Tree, criterion):
 
     est = Tree(criterion=criterion, random_state=1234)
     est.fit(X)
-    sim_mat = est.affinity_matrix_
+    sim_mat = est.affinity_matrix_.toarray()
 
     # there is quite a bit of variance in the performance at the tree level
     if criterion == "twomeans":
@@ -208,7 +220,7 @@ def test_check_rotated_blobs(name, Tree, criterion):
 
     est = Tree(criterion=criterion, random_state=1234)
     est.fit(X)
-    sim_mat = est.affinity_matrix_
+    sim_mat = est.affinity_matrix_.toarray()
 
     # there is quite a bit of variance in the performance at the tree level
     if criterion == "twomeans":
@@ -242,7 +254,7 @@ def test_check_iris(name, Tree, criterion):
     n_classes = len(np.unique(iris.target))
     est = Tree(criterion=criterion, random_state=12345)
     est.fit(iris.data, iris.target)
-    sim_mat = est.affinity_matrix_
+    sim_mat = est.affinity_matrix_.toarray()
 
     # there is quite a bit of variance in the performance at the tree level
     if criterion == "twomeans":
@@ -266,6 +278,165 @@ def test_check_iris(name, Tree, criterion):
     )
 
 
+@pytest.mark.parametrize("name,Tree", TREE_CLUSTERS.items())
+def test_affinity_matrix_sparse(name, Tree):
+    """Test the affinity matrix is the sparse 0-1 leaf co-occurrence matrix."""
+    X, _ = make_blobs(n_samples=50, centers=2, n_features=4, random_state=1234)
+
+    est = Tree(random_state=1234)
+    est.fit(X)
+    sim_mat = est.affinity_matrix_
+    assert issparse(sim_mat)
+    assert sim_mat.dtype == np.uint8
+
+    X_leaves = est.apply(X)
+    expected = (X_leaves[:, np.newaxis] == X_leaves[np.newaxis, :]).astype(np.uint8)
+    assert_array_equal(sim_mat.toarray(), expected)
+
+    # transform materializes the same affinity matrix as a dense array
+    X_new = est.transform(X)
+    assert not issparse(X_new)
+    assert_array_equal(X_new, expected)
+
+
+@pytest.mark.parametrize("name,Tree", TREE_CLUSTERS.items())
+def test_affinity_embedding(name, Tree):
+    """Test the compact embedding preserves the distances between affinity rows."""
+    X, _ = make_blobs(n_samples=50, centers=2, n_features=4, random_state=1234)
+
+    est = Tree(random_state=1234).fit(X)
+    embedding = _affinity_embedding(est.affinity_matrix_)
+    assert embedding.shape == (X.shape[0], est.get_n_leaves())
+
+    sim_mat = est.affinity_matrix_.toarray().astype(np.float64)
+    assert_array_almost_equal(euclidean_distances(embedding), euclidean_distances(sim_mat))
+
+
+@pytest.mark.parametrize("name,Tree", TREE_CLUSTERS.items())
+def test_transform_training_data(name, Tree):
+    """Test fit_transform returns the fitted affinity matrix of the training data."""
+    X, _ = make_blobs(n_samples=50, centers=2, n_features=4, random_state=1234)
+    X = X.astype(np.float32)
+
+    est = Tree(random_state=1234)
+    X_new = est.fit_transform(X)
+    assert_array_equal(X_new, est.affinity_matrix_.toarray())
+    assert_array_equal(X_new, est.transform(X))
+    assert_array_equal(est.fit_predict(X), est.labels_)
+
+    # the training data mutated in place after fit is transformed anew
+    X[:] = X[::-1]
+    assert_array_equal(est.transform(X), X_new[::-1, ::-1])
+
+
+@pytest.mark.parametrize("name,Tree", TREE_CLUSTERS.items())
+def test_transform_validated_input(name, Tree):
+    """Test input that skips the full validation is transformed the same."""
+    X, _ = make_blobs(n_samples=50, centers=2, n_features=4, random_state=1234)
+
+    est = Tree(random_state=1234).fit(X)
+    X_new = X[:10].astype(np.float32)
+    assert est._is_valid_dense(X_new)
+    assert_array_equal(est.transform(X_new), est.transform(X[:10].tolist()))
+
+    # invalid input still goes through the full validation
+    X_new[0, 0] = np.nan
+    assert not est._is_valid_dense(X_new)
+    with pytest.raises(ValueError, match="NaN"):
+        est.transform(X_new)
+
+
+@pytest.mark.parametrize("name,Tree", TREE_CLUSTERS.items())
+def test_apply_and_group(name, Tree):
+    """Test the fused apply and grouping matches apply followed by a grouping."""
+    X, _ = make_blobs(n_samples=50, centers=2, n_features=4, random_state=1234)
+
+    est = Tree(random_state=1234)
+    est.fit(X)
+
+    leaves, order, bounds = est._apply_and_group(X)
+    X_leaves = est.apply(X)
+    assert_array_equal(leaves, X_leaves)
+    assert_array_equal(order, np.argsort(X_leaves, kind="stable"))
+    assert_array_equal(np.diff(bounds), np.bincount(X_leaves, minlength=est.tree_.node_count))
+
+
+@pytest.mark.parametrize("name,Tree", TREE_CLUSTERS.items())
+@pytest.mark.parametrize("weighted", [False, True])
+def test_weighted_n_node_samples(name, Tree, weighted):
+    """Test the weight of each node is the total weight of its samples."""
+    X, _ = make_blobs(n_samples=50, centers=2, n_features=4, random_state=1234)
+    sample_weight = np.random.RandomState(0).uniform(0.5, 2.0, size=50) if weighted else None
+
+    est = Tree(random_state=1234)
+    est.fit(X, sample_weight=sample_weight)
+
+    weights = np.ones(50) if sample_weight is None else sample_weight
+    expected = np.bincount(est.apply(X), weights=weights, minlength=est.tree_.node_count)
+    is_leaf = est.tree_.children_left == TREE_LEAF
+    assert_almost_equal(est.tree_.weighted_n_node_samples[0], weights.sum())
+    assert_almost_equal(est.tree_.weighted_n_node_samples[is_leaf], expected[is_leaf])
+
+
+@pytest.mark.parametrize("name,Tree", TREE_CLUSTERS.items())
+@pytest.mark.parametrize("criterion", [TwoMeans, FastBIC])
+def test_criterion_instance(name, Tree, criterion):
+    """Test passing a criterion instance is equivalent to passing its name."""
+    X, _ = make_blobs(n_samples=50, centers=2, n_features=4, random_state=1234)
+
+    clone = criterion().clone()
+    assert type(clone) is criterion
+
+    est = Tree(criterion=criterion(), random_state=1234).fit(X)
+    est_name = Tree(criterion=criterion.__name__.lower(), random_state=1234).fit(X)
+    assert_array_equal(est.apply(X), est_name.apply(X))
+
+
+def test_twomeans_variance_of_offset_data():
+    """Test the variances of the children against two passes on data with a large mean."""
+    rng = np.random.default_rng(0)
+
+    # a single sorted feature, whose samples keep their order when split
+    X = (1e6 + np.sort(rng.normal(size=(200, 1)), axis=0)).astype(np.float32)
+
+    est = UnsupervisedDecisionTree(criterion="twomeans", max_depth=1, random_state=0).fit(X)
+    leaves = est.apply(X)
+    X_64 = X[:, 0].astype(np.float64)
+    for node in (1, 2):
+        assert_allclose(est.tree_.impurity[node], np.var(X_64[leaves == node]), rtol=1e-7)
+
+
+@pytest.mark.parametrize(
+    "Tree", [ObliqueDecisionTreeClassifier, PatchObliqueDecisionTreeClassifier]
+)
+@pytest.mark.parametrize("criterion", [Gini, Entropy])
+def test_oblique_criterion_instance(Tree, criterion):
+    """Test passing a criterion instance is equivalent to passing its name."""
+    X, y = iris.data, iris.target
+    n_classes = np.array([3], dtype=np.intp)
+
+    clone = _clone_criterion(criterion(1, n_classes))
+    assert type(clone) is criterion
+    assert_array_equal(clone.__reduce__()[1][1], n_classes)
+
+    est = Tree(criterion=criterion(1, n_classes), random_state=0).fit(X, y)
+    est_name = Tree(criterion=criterion.__name__.lower(), random_state=0).fit(X, y)
+    assert_array_equal(est.apply(X), est_name.apply(X))
+
+
+@pytest.mark.parametrize("name,Tree", TREE_CLUSTERS.items())
+@pytest.mark.parametrize(
+    "params",
+    [{"criterion": "gini"}, {"splitter": "random"}, {"clustering_func_args": "ward"}],
+)
+def test_invalid_parameters(name, Tree, params):
+    """Test invalid parameters are rejected before the tree is built."""
+    X, _ = make_blobs(n_samples=20, centers=2, n_features=4, random_state=1234)
+
+    with pytest.raises(ValueError, match="parameter of"):
+        Tree(**params).fit(X)
+
+
 def test_oblique_tree_sampling():
     """Test Oblique Decision Trees.
 
@@ -323,6 +494,201 @@ def test_oblique_tree_feature_combinations():
     assert clf.feature_combinations_ == 1
 
 
+@pytest.mark.parametrize(
+    "clf",
+    [
+        ObliqueDecisionTreeClassifier(random_state=0),
+        # best-first trees are not stored in the pre-order the nodes are packed in
+        ObliqueDecisionTreeClassifier(max_leaf_nodes=50, random_state=0),
+        PatchObliqueDecisionTreeClassifier(
+            max_patch_height=4, max_patch_width=4, data_height=8, data_width=8, random_state=0
+        ),
+    ],
+)
+def test_oblique_tree_apply(clf):
+    """Test that applying the packed oblique nodes agrees with the decision path."""
+    X, y = digits.data, digits.target
+    clf.fit(X, y)
+
+    is_leaf = clf.tree_.children_left == TREE_LEAF
+    _, leaves = (clf.decision_path(X)[:, is_leaf]).nonzero()
+    assert_array_equal(clf.apply(X), np.flatnonzero(is_leaf)[leaves])
+
+    # projections with missing values go to the right child in both traversals
+    X_nan = X.astype(np.float32)
+    X_nan[::3, ::5] = np.nan
+    _, leaves = (clf.tree_.decision_path(X_nan)[:, is_leaf]).nonzero()
+    assert_array_equal(clf.tree_.apply(X_nan), np.flatnonzero(is_leaf)[leaves])
+
+    # the packed nodes are rebuilt after unpickling
+    clf_loaded = pickle.loads(pickle.dumps(clf))
+    assert_array_equal(clf_loaded.apply(X), clf.apply(X))
+
+    # only the split nodes have a projection vector
+    proj_vecs = clf.tree_.get_projection_matrix()
+    assert_array_equal(clf_loaded.tree_.get_projection_matrix(), proj_vecs)
+    assert_array_equal(np.any(proj_vecs != 0, axis=1), ~is_leaf)
+
+
+@pytest.mark.parametrize(
+    "Tree", [ObliqueDecisionTreeClassifier, PatchObliqueDecisionTreeClassifier]
+)
+def test_oblique_tree_apply_single_leaf(Tree):
+    """Test applying a tree whose root is a leaf, of which no node is packed."""
+    X = digits.data
+    y = np.zeros(X.shape[0], dtype=int)
+
+    clf = Tree(random_state=0).fit(X, y)
+    assert clf.tree_.node_count == 1
+    assert_array_equal(clf.apply(X), np.zeros(X.shape[0], dtype=np.intp))
+
+
+@pytest.mark.parametrize(
+    "n_features, params",
+    [(4, dict()), (200, dict()), (8, dict(max_features=40, feature_combinations=6))],
+)
+def test_oblique_tree_partitions_samples(n_features, params):
+    """Test that the samples of each node are partitioned as they are applied.
+
+    Few features make the projection matrix dense enough to be computed with BLAS,
+    while many features keep gathering its non-zeros. Projections with many
+    non-zeros are summed in another order by BLAS than when the tree is applied,
+    and more projections than are computed at once are computed in blocks.
+    """
+    X, y = make_classification(
+        n_samples=500, n_features=n_features, n_informative=4, n_redundant=0, random_state=0
+    )
+    clf = ObliqueDecisionTreeClassifier(random_state=0, max_depth=5, **params).fit(X, y)
+
+    n_leaf_samples = np.bincount(clf.apply(X), minlength=clf.tree_.node_count)
+    is_leaf = clf.tree_.children_left == TREE_LEAF
+    assert_array_equal(n_leaf_samples[is_leaf], clf.tree_.n_node_samples[is_leaf])
+
+
+@pytest.mark.parametrize("discrete", [False, True])
+def test_oblique_tree_sorts_large_nodes(discrete):
+    """Test the splits of nodes large enough for their projections to be radix sorted."""
+    X, y = make_classification(n_samples=5000, n_features=50, random_state=0)
+    if discrete:
+        # many duplicated projections, with both signs and zeros
+        X = np.round(X)
+    clf = ObliqueDecisionTreeClassifier(random_state=0, max_depth=4).fit(X, y)
+
+    # the split positions found in the sorted projections agree with the
+    # numbers of samples on each side of the thresholds
+    n_leaf_samples = np.bincount(clf.apply(X), minlength=clf.tree_.node_count)
+    is_leaf = clf.tree_.children_left == TREE_LEAF
+    assert_array_equal(n_leaf_samples[is_leaf], clf.tree_.n_node_samples[is_leaf])
+
+
+@pytest.mark.parametrize("n_jobs", [2, -1])
+def test_oblique_tree_n_jobs(n_jobs):
+    """Test that growing the tree with several threads does not depend on n_jobs."""
+    # enough samples for the root nodes to be projected in parallel
+    X, y = make_classification(n_samples=12000, n_features=10, random_state=0)
+
+    clf = ObliqueDecisionTreeClassifier(random_state=0, max_depth=6, n_jobs=3).fit(X, y)
+    clf_parallel = ObliqueDecisionTreeClassifier(random_state=0, max_depth=6, n_jobs=n_jobs)
+    clf_parallel.fit(X, y)
+
+    assert_array_equal(clf.apply(X), clf_parallel.apply(X))
+    assert_array_equal(clf.tree_.threshold, clf_parallel.tree_.threshold)
+    assert_array_equal(clf.tree_.children_left, clf_parallel.tree_.children_left)
+
+    # the samples of the leaves partition the training set
+    n_leaf_samples = np.bincount(clf_parallel.apply(X), minlength=clf_parallel.tree_.node_count)
+    is_leaf = clf_parallel.tree_.children_left == TREE_LEAF
+    assert_array_equal(n_leaf_samples[is_leaf], clf_parallel.tree_.n_node_samples[is_leaf])
+
+    # best-first trees are grown serially and only project in parallel
+    clf = ObliqueDecisionTreeClassifier(random_state=0, max_leaf_nodes=20).fit(X, y)
+    clf_parallel = ObliqueDecisionTreeClassifier(
+        random_state=0, max_leaf_nodes=20, n_jobs=n_jobs
+    ).fit(X, y)
+    assert_array_equal(clf.apply(X), clf_parallel.apply(X))
+    assert_array_equal(clf.tree_.threshold, clf_parallel.tree_.threshold)
+
+
+@pytest.mark.parametrize(
+    "Tree, params",
+    [
+        (ObliqueDecisionTreeClassifier, dict()),
+        (
+            PatchObliqueDecisionTreeClassifier,
+            dict(max_patch_height=4, max_patch_width=4, data_height=4, data_width=5),
+        ),
+    ],
+)
+def test_oblique_tree_n_jobs_reproducible(Tree, params):
+    """Test that a tree grown with several threads does not depend on their scheduling."""
+    X, y = make_classification(n_samples=2000, n_features=20, random_state=0)
+
+    clf = Tree(random_state=0, n_jobs=2, **params).fit(X, y)
+    for _ in range(5):
+        clf_refit = Tree(random_state=0, n_jobs=2, **params).fit(X, y)
+        assert_array_equal(clf.tree_.children_left, clf_refit.tree_.children_left)
+        assert_array_equal(clf.tree_.children_right, clf_refit.tree_.children_right)
+        assert_array_equal(clf.tree_.threshold, clf_refit.tree_.threshold)
+        assert_array_equal(clf.tree_.value, clf_refit.tree_.value)
+        assert_array_equal(clf.apply(X), clf_refit.apply(X))
+
+
+def test_oblique_tree_float64_without_check_input():
+    """Test that a tree grown level by level converts X without input checks."""
+    X, y = make_classification(n_samples=200, n_features=10, random_state=0)
+
+    clf = ObliqueDecisionTreeClassifier(random_state=0, n_jobs=2)
+    clf.fit(X.astype(np.float32), y)
+    clf_float64 = ObliqueDecisionTreeClassifier(random_state=0, n_jobs=2)
+    clf_float64.fit(X, y, check_input=False)
+
+    assert_array_equal(clf.tree_.threshold, clf_float64.tree_.threshold)
+
+
+def test_patch_tree_n_jobs():
+    """Test that patches are summed with several threads in each splitter of a level."""
+    # enough samples for the root to be summed with all threads, with patches
+    # large enough to be summed from summed-area tables
+    X, y = make_classification(n_samples=12000, n_features=64, random_state=0)
+    params = dict(
+        min_patch_height=4,
+        max_patch_height=8,
+        min_patch_width=4,
+        max_patch_width=8,
+        data_height=8,
+        data_width=8,
+        max_depth=4,
+        random_state=0,
+    )
+
+    clf = PatchObliqueDecisionTreeClassifier(n_jobs=2, **params).fit(X, y)
+    clf_parallel = PatchObliqueDecisionTreeClassifier(n_jobs=4, **params).fit(X, y)
+
+    assert_array_equal(clf.apply(X), clf_parallel.apply(X))
+    assert_array_equal(clf.tree_.threshold, clf_parallel.tree_.threshold)
+
+    n_leaf_samples = np.bincount(clf_parallel.apply(X), minlength=clf_parallel.tree_.node_count)
+    is_leaf = clf_parallel.tree_.children_left == TREE_LEAF
+    assert_array_equal(n_leaf_samples[is_leaf], clf_parallel.tree_.n_node_samples[is_leaf])
+
+
+@pytest.mark.parametrize("n_features", [4, 200])
+def test_oblique_tree_memory_layout(n_features):
+    """Test that the tree does not depend on the memory layout of X."""
+    X, y = make_classification(
+        n_samples=500, n_features=n_features, n_informative=4, n_redundant=0, random_state=0
+    )
+    X = X.astype(np.float32)
+
+    clf = ObliqueDecisionTreeClassifier(random_state=0, max_depth=5)
+    clf.fit(np.ascontiguousarray(X), y)
+    clf_fortran = ObliqueDecisionTreeClassifier(random_state=0, max_depth=5)
+    clf_fortran.fit(np.asfortranarray(X), y)
+
+    assert_array_equal(clf.tree_.threshold, clf_fortran.tree_.threshold)
+    assert_array_equal(clf.apply(X), clf_fortran.apply(X))
+
+
 def test_patch_tree_errors():
     """Test errors that are specifically raised by manifold trees."""
     X, y = digits.data, digits.target
@@ -389,6 +755,40 @@ def test_patch_tree_overfits():
     assert accuracy_score(y, clf.predict(X)) > 0.99
 
 
+@pytest.mark.parametrize(
+    "patch_height, patch_width, max_features", [((1, 1), (1, 1), 8), ((2, 3), (4, 5), None)]
+)
+def test_patch_tree_samples_patches(patch_height, patch_width, max_features):
+    """Test that the projections of a patch tree sum rectangular patches of the data.
+
+    Small patches are summed by gathering their features, while large patches are
+    summed from summed-area tables.
+    """
+    X, y = digits.data, digits.target
+
+    clf = PatchObliqueDecisionTreeClassifier(
+        min_patch_height=patch_height[0],
+        max_patch_height=patch_height[1],
+        min_patch_width=patch_width[0],
+        max_patch_width=patch_width[1],
+        data_height=8,
+        data_width=8,
+        max_features=max_features,
+        random_state=0,
+    ).fit(X, y)
+
+    is_leaf = clf.tree_.children_left == TREE_LEAF
+    for proj_vec in clf.tree_.get_projection_matrix()[~is_leaf]:
+        rows, cols = np.nonzero(proj_vec.reshape(8, 8))
+        assert patch_height[0] <= np.ptp(rows) + 1 <= patch_height[1]
+        assert patch_width[0] <= np.ptp(cols) + 1 <= patch_width[1]
+        assert len(rows) == (np.ptp(rows) + 1) * (np.ptp(cols) + 1)
+        assert_array_equal(proj_vec[proj_vec != 0], 1)
+
+    n_leaf_samples = np.bincount(clf.apply(X), minlength=clf.tree_.node_count)
+    assert_array_equal(n_leaf_samples[is_leaf], clf.tree_.n_node_samples[is_leaf])
+
+
 def test_patch_tree_compared():
     """Test patch tree against other tree models."""
     X, y = digits.data, digits.target